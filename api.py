@@ -0,0 +1,136 @@
+"""
+Headless HTTP API for summarization and PDF chat.
+
+Workers keep no per-client state: uploads, extracted text, vector indexes,
+summary trees and caches all live under CACHE_DIR, keyed by file hash.
+Point every replica at the same CACHE_DIR (shared volume) and any of them
+can serve any request. The Gemini quota (GEMINI_RPM / GEMINI_TPM) and
+index builds are coordinated through CACHE_DIR too, so N workers share
+one quota and never build the same index twice.
+
+Run:
+    uvicorn api:app --host 0.0.0.0 --port 8000 --workers 4
+"""
+import asyncio
+import logging
+from typing import List, Optional
+from fastapi import FastAPI, File, HTTPException, UploadFile
+from pydantic import BaseModel
+from summarizer import summarize_text, summarize_pdf_cached, is_error_result
+from chat_pdf import chat_with_pdf, create_vectorstore
+from uploads import spool_upload, get_spooled
+from utils import read_pdf_cached
+
+logging.getLogger("streamlit").setLevel(logging.ERROR)  # st.* calls are no-ops outside `streamlit run`
+
+app = FastAPI(title="AI PDF & Text Assistant API", version="2.0")
+
+SUMMARY_TYPES = ("concise", "detailed", "bullet")
+
+
+class SummarizeRequest(BaseModel):
+    text: str
+    summary_type: str = "concise"
+
+
+class DocumentSummarizeRequest(BaseModel):
+    summary_type: str = "concise"
+
+
+class ChatRequest(BaseModel):
+    question: str
+
+
+class SummaryResponse(BaseModel):
+    summary: str
+
+
+class DocumentResponse(BaseModel):
+    file_hash: str
+    size: int
+    characters: int
+    indexed: bool
+
+
+class ChatResponse(BaseModel):
+    answer: str
+    sources: List[str]
+
+
+def _check_summary_type(summary_type):
+    if summary_type not in SUMMARY_TYPES:
+        raise HTTPException(status_code=422, detail=f"summary_type must be one of {', '.join(SUMMARY_TYPES)}")
+
+
+def _raise_for_error(result):
+    """Turn the user-facing error strings of the core functions into HTTP errors."""
+    if not is_error_result(result):
+        return
+    if result.startswith("🚫"):
+        raise HTTPException(status_code=429, detail=result)
+    if result.startswith("⏱️"):
+        raise HTTPException(status_code=504, detail=result)
+    raise HTTPException(status_code=502, detail=result)
+
+
+def _document_or_404(file_hash):
+    upload = get_spooled(file_hash)
+    if upload is None:
+        raise HTTPException(status_code=404, detail="Unknown document - upload it first.")
+    return upload
+
+
+@app.get("/health")
+async def health():
+    return {"status": "ok"}
+
+
+@app.post("/summarize", response_model=SummaryResponse)
+async def summarize(request: SummarizeRequest):
+    """Summarize raw text."""
+    _check_summary_type(request.summary_type)
+    if len(request.text.strip()) < 50:
+        raise HTTPException(status_code=422, detail="Provide at least 50 characters of text.")
+    summary = await asyncio.to_thread(summarize_text, request.text, request.summary_type)
+    _raise_for_error(summary)
+    return SummaryResponse(summary=summary)
+
+
+@app.post("/documents", response_model=DocumentResponse)
+async def upload_document(file: UploadFile = File(...), index: bool = True):
+    """Store a PDF in the shared store, extract its text and (optionally) build its search index."""
+    upload = await asyncio.to_thread(spool_upload, file.file)
+    text = await asyncio.to_thread(read_pdf_cached, upload, upload.file_hash)
+    if not text:
+        raise HTTPException(status_code=422, detail="Could not extract text from PDF.")
+    indexed = False
+    if index:
+        indexed = await asyncio.to_thread(create_vectorstore, upload.file_hash, text) is not None
+    return DocumentResponse(file_hash=upload.file_hash, size=upload.size, characters=len(text), indexed=indexed)
+
+
+@app.post("/documents/{file_hash}/summarize", response_model=SummaryResponse)
+async def summarize_document(file_hash: str, request: Optional[DocumentSummarizeRequest] = None):
+    """Summarize a stored PDF (cached across replicas by file hash)."""
+    request = request or DocumentSummarizeRequest()
+    _check_summary_type(request.summary_type)
+    upload = _document_or_404(file_hash)
+    text = await asyncio.to_thread(read_pdf_cached, upload, file_hash)
+    if not text:
+        raise HTTPException(status_code=422, detail="Could not extract text from PDF.")
+    summary = await asyncio.to_thread(summarize_pdf_cached, file_hash, text, request.summary_type)
+    _raise_for_error(summary)
+    return SummaryResponse(summary=summary)
+
+
+@app.post("/documents/{file_hash}/chat", response_model=ChatResponse)
+async def chat_document(file_hash: str, request: ChatRequest):
+    """Ask a question about a stored PDF."""
+    if not request.question.strip():
+        raise HTTPException(status_code=422, detail="Question is empty.")
+    upload = _document_or_404(file_hash)
+    answer, docs = await asyncio.to_thread(chat_with_pdf, upload, request.question, file_hash)
+    if answer.startswith("❌ No relevant information"):
+        return ChatResponse(answer=answer, sources=[])
+    _raise_for_error(answer)
+    return ChatResponse(answer=answer, sources=[doc.page_content for doc in docs])
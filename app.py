@@ -4,15 +4,24 @@
 # st.markdown("<div style='text-align:center;color:#666;'><strong>AI Assistant v2.0</strong> | Powered by Groq</div>", unsafe_allow_html=True)
 import streamlit as st
 import os
+import logging
 from dotenv import load_dotenv
 from summarizer import summarize_text, summarize_pdf_cached
-from chat_pdf import chat_with_pdf
-from utils import read_pdf as read_pdf_util, get_file_hash, truncate_text
+from chat_pdf import chat_with_pdf, get_vectorstore_footprint, prewarm_index, index_status, SUGGESTED_QUESTIONS
+from utils import read_pdf_cached, truncate_text
+from uploads import spool_upload
+from cache import shared_cache, vectorstore_cache
+from history import ChatHistory
+from scheduler import scheduler
+from extractive import cached_extractive_summary
+from library import add_document, remove_document, list_documents, all_tags, chat_with_library
 from datetime import datetime
 
 # Load environment variables
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # Page configuration
 st.set_page_config(
     page_title="AI PDF & Text Tool",
@@ -71,15 +80,75 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+HISTORY_PAGE_SIZE = 5  # Chat turns rendered per "show earlier" step
+INDEX_STATUS_POLL_SECONDS = 2  # How often the "Indexing" status re-checks a background build
+INDEX_STATUS_LABELS = {
+    "ready": "✅ Ready",
+    "indexing": "⏳ Indexing",
+    "failed": "❌ Failed",
+    "idle": "💤 On demand",
+}
+
 # Initialize session state
 if 'chat_history' not in st.session_state:
-    st.session_state.chat_history = []
+    st.session_state.chat_history = ChatHistory()
+if 'library_history' not in st.session_state:
+    st.session_state.library_history = ChatHistory()
+if 'history_window' not in st.session_state:
+    st.session_state.history_window = HISTORY_PAGE_SIZE
 if 'current_pdf_hash' not in st.session_state:
     st.session_state.current_pdf_hash = None
 if 'pdf_text' not in st.session_state:
     st.session_state.pdf_text = None
-if 'summary_cache' not in st.session_state:
-    st.session_state.summary_cache = {}
+
+
+def reset_chat_history():
+    """Drop the conversation (including archived pages) and collapse the view."""
+    st.session_state.chat_history.clear()
+    st.session_state.history_window = HISTORY_PAGE_SIZE
+
+
+def render_turn(question, answer):
+    """Render one question/answer pair."""
+    st.markdown(f"""
+    <div class='chat-message user-message'>
+        <strong>🙋 You:</strong><br>{question}
+    </div>
+    """, unsafe_allow_html=True)
+    
+    st.markdown(f"""
+    <div class='chat-message assistant-message'>
+        <strong>🤖 Assistant:</strong><br>{answer}
+    </div>
+    """, unsafe_allow_html=True)
+
+
+@st.fragment(run_every=INDEX_STATUS_POLL_SECONDS)
+def watch_index_status(file_hash):
+    """Poll a background build and rerun the page once it finishes, to show its result."""
+    state, _ = index_status(file_hash)
+    if state != "indexing":
+        st.rerun()
+    st.metric("🔄 Status", INDEX_STATUS_LABELS[state])
+
+
+def render_chat_history(history):
+    """Render only the newest turns; older ones are loaded on request."""
+    if not history:
+        return
+    
+    st.markdown("### 📜 Conversation History")
+    
+    hidden = len(history) - st.session_state.history_window
+    if hidden > 0:
+        if st.button(f"⬆️ Show earlier messages ({hidden} hidden)", key="show_earlier"):
+            st.session_state.history_window += HISTORY_PAGE_SIZE
+            st.rerun()
+    
+    for question, answer in history.window(st.session_state.history_window):
+        render_turn(question, answer)
+    
+    st.divider()
 
 # Sidebar
 with st.sidebar:
@@ -97,23 +166,46 @@ with st.sidebar:
     
     # Statistics
     st.subheader("📊 Session Stats")
+    cache_stats = shared_cache.snapshot()
     col1, col2 = st.columns(2)
     with col1:
-        st.metric("Summaries", len(st.session_state.summary_cache))
+        st.metric("Cache Hits", cache_stats["hits"])
+        st.metric("Evictions", cache_stats["evictions"])
     with col2:
+        st.metric("Cache Misses", cache_stats["misses"])
         st.metric("Chat Msgs", len(st.session_state.chat_history))
+    st.caption(
+        f"Hit rate {cache_stats['hit_rate']:.0%} | "
+        f"RAM {cache_stats['memory_bytes'] / (1024 * 1024):.1f} MB | "
+        f"Disk {cache_stats['disk_bytes'] / (1024 * 1024):.1f} MB"
+    )
+    
+    store_stats = get_vectorstore_footprint()
+    st.caption(
+        f"🧠 Vector stores: {store_stats['entries']} | "
+        f"{store_stats['total_bytes'] / (1024 * 1024):.1f} MB of "
+        f"{store_stats['max_bytes'] / (1024 * 1024):.0f} MB cap | "
+        f"{store_stats['evictions']} evicted"
+    )
+    
+    llm_stats = scheduler.snapshot()
+    st.caption(
+        f"🤖 LLM calls: {llm_stats['upstream']} upstream | "
+        f"{llm_stats['coalesced']} coalesced | {llm_stats['queued']} queued"
+    )
     
     st.divider()
     
     # Clear buttons
     if st.button("🗑️ Clear Chat History", use_container_width=True):
-        st.session_state.chat_history = []
+        reset_chat_history()
         st.rerun()
     
     if st.button("🗑️ Clear Cache", use_container_width=True):
         st.cache_data.clear()
         st.cache_resource.clear()
-        st.session_state.summary_cache = {}
+        shared_cache.clear()
+        vectorstore_cache.clear()
         st.success("Cache cleared!")
     
     st.divider()
@@ -124,7 +216,7 @@ st.markdown('<p class="main-header">📄 AI PDF & Text Assistant</p>', unsafe_al
 st.markdown("##### Powered by Groq LLaMA Models | Fast & Intelligent Document Analysis")
 
 # Create tabs
-tab1, tab2, tab3 = st.tabs(["📝 Summarize", "💬 Chat with PDF", "ℹ️ Help"])
+tab1, tab2, tab_library, tab3 = st.tabs(["📝 Summarize", "💬 Chat with PDF", "📚 Library", "ℹ️ Help"])
 
 # ============== TAB 1: SUMMARIZATION ==============
 with tab1:
@@ -151,6 +243,11 @@ with tab1:
                 "bullet": "📋 Bullet Points"
             }[x]
         )
+        compress_input = st.checkbox(
+            "🗜️ Condense long input locally",
+            value=True,
+            help="Send the most important sentences instead of the first 5,000 characters"
+        )
     
     st.divider()
     
@@ -189,7 +286,9 @@ with tab1:
         if uploaded_file:
             # Get file info
             file_size = uploaded_file.size / (1024 * 1024)  # MB
-            pdf_hash = get_file_hash(uploaded_file)
+            # Spool to disk once per upload; hashing is streamed
+            spooled_pdf = spool_upload(uploaded_file)
+            pdf_hash = spooled_pdf.file_hash
             
             col1, col2, col3 = st.columns(3)
             with col1:
@@ -201,7 +300,7 @@ with tab1:
             
             # Extract text with progress
             with st.spinner("📖 Extracting text from PDF..."):
-                text_to_summarize = read_pdf_util(uploaded_file, method='pypdf2')
+                text_to_summarize = read_pdf_cached(spooled_pdf, pdf_hash, method='pypdf2')
             
             if text_to_summarize:
                 st.success(f"✅ Extracted {len(text_to_summarize.split())} words from PDF")
@@ -239,15 +338,26 @@ with tab1:
             # Display processing info
             st.info(f"📊 Processing: {total_chars:,} characters | {total_words:,} words")
             
+            # Instant local preview while the AI summary is generated
+            with st.spinner("⚡ Building instant preview..."):
+                try:
+                    preview = cached_extractive_summary(text_to_summarize, max_sentences=5)
+                except Exception as e:
+                    preview = None
+                    logger.warning("Preview failed: %s", e)
+            if preview:
+                with st.expander("⚡ Instant Preview (key sentences, offline)", expanded=True):
+                    st.write(preview)
+            
             # Show progress
             with st.spinner("🤖 AI is generating your summary..."):
                 start_time = datetime.now()
                 
                 # Use cached version for PDFs
                 if pdf_hash:
-                    summary = summarize_pdf_cached(pdf_hash, text_to_summarize, summary_type)
+                    summary = summarize_pdf_cached(pdf_hash, text_to_summarize, summary_type, compress=compress_input)
                 else:
-                    summary = summarize_text(text_to_summarize, summary_type)
+                    summary = summarize_text(text_to_summarize, summary_type, compress=compress_input)
                 
                 end_time = datetime.now()
                 duration = (end_time - start_time).total_seconds()
@@ -297,13 +407,17 @@ with tab2:
     )
     
     if uploaded_pdf:
-        # Get file hash for caching
-        current_hash = get_file_hash(uploaded_pdf)
+        # Spool to disk once per upload and get its hash for caching
+        spooled_pdf = spool_upload(uploaded_pdf)
+        current_hash = spooled_pdf.file_hash
+        
+        # Start indexing now so the first question only waits for what's left
+        prewarm_index(spooled_pdf, current_hash)
         
         # Check if new PDF
         if current_hash != st.session_state.current_pdf_hash:
             st.session_state.current_pdf_hash = current_hash
-            st.session_state.chat_history = []
+            reset_chat_history()
             st.session_state.pdf_text = None
         
         # Display PDF info
@@ -314,35 +428,26 @@ with tab2:
             file_size_mb = uploaded_pdf.size / (1024 * 1024)
             st.metric("📊 Size", f"{file_size_mb:.1f} MB")
         with col3:
-            st.metric("💬 Messages", len(st.session_state.chat_history))
+            messages_metric = st.empty()
+        index_state, index_notices = index_status(current_hash)
         with col4:
-            st.metric("🔄 Status", "✅ Ready")
+            if index_state == "indexing":
+                watch_index_status(current_hash)
+            else:
+                st.metric("🔄 Status", INDEX_STATUS_LABELS[index_state])
+        
+        # Truncation notices and errors from the background build
+        for level, message in index_notices:
+            getattr(st, level)(message)
         
         st.divider()
         
         # Chat interface
         st.subheader("💭 Ask Questions")
         
-        # Display chat history
-        if st.session_state.chat_history:
-            st.markdown("### 📜 Conversation History")
-            
-            for idx, (question, answer) in enumerate(st.session_state.chat_history):
-                # User message
-                st.markdown(f"""
-                <div class='chat-message user-message'>
-                    <strong>🙋 You:</strong><br>{question}
-                </div>
-                """, unsafe_allow_html=True)
-                
-                # Assistant message
-                st.markdown(f"""
-                <div class='chat-message assistant-message'>
-                    <strong>🤖 Assistant:</strong><br>{answer}
-                </div>
-                """, unsafe_allow_html=True)
-            
-            st.divider()
+        # Chat history is filled in after the question is processed so the
+        # newest turn is rendered exactly once
+        history_container = st.container()
         
         # Question input
         col1, col2 = st.columns([4, 1])
@@ -363,17 +468,17 @@ with tab2:
             col1, col2 = st.columns(2)
             with col1:
                 if st.button("📌 Summarize this document", use_container_width=True):
-                    user_question = "Can you provide a summary of this document?"
+                    user_question = SUGGESTED_QUESTIONS[0]
                     ask_button = True
                 if st.button("🔍 What are the key points?", use_container_width=True):
-                    user_question = "What are the key points in this document?"
+                    user_question = SUGGESTED_QUESTIONS[1]
                     ask_button = True
             with col2:
                 if st.button("📊 Main findings?", use_container_width=True):
-                    user_question = "What are the main findings or conclusions?"
+                    user_question = SUGGESTED_QUESTIONS[2]
                     ask_button = True
                 if st.button("👥 Who is mentioned?", use_container_width=True):
-                    user_question = "Who are the main people or entities mentioned?"
+                    user_question = SUGGESTED_QUESTIONS[3]
                     ask_button = True
         
         # Process question
@@ -383,7 +488,7 @@ with tab2:
                 
                 # Get answer
                 answer, source_docs = chat_with_pdf(
-                    uploaded_pdf,
+                    spooled_pdf,
                     user_question,
                     current_hash,
                     st.session_state.chat_history
@@ -395,21 +500,8 @@ with tab2:
             # Add to history
             st.session_state.chat_history.append((user_question, answer))
             
-            # Display new answer
             st.success(f"✅ Answer generated in {duration:.2f} seconds")
             
-            st.markdown(f"""
-            <div class='chat-message user-message'>
-                <strong>🙋 You:</strong><br>{user_question}
-            </div>
-            """, unsafe_allow_html=True)
-            
-            st.markdown(f"""
-            <div class='chat-message assistant-message'>
-                <strong>🤖 Assistant:</strong><br>{answer}
-            </div>
-            """, unsafe_allow_html=True)
-            
             # Show sources if available
             if source_docs:
                 with st.expander("📚 View Source Excerpts"):
@@ -440,11 +532,15 @@ with tab2:
             
             with col3:
                 if st.button("🗑️ Clear Chat", key="clear_chat_btn", use_container_width=True):
-                    st.session_state.chat_history = []
+                    reset_chat_history()
                     st.rerun()
         
         elif ask_button and not user_question.strip():
             st.warning("⚠️ Please enter a question!")
+        
+        messages_metric.metric("💬 Messages", len(st.session_state.chat_history))
+        with history_container:
+            render_chat_history(st.session_state.chat_history)
     
     else:
         # No PDF uploaded
@@ -464,6 +560,113 @@ with tab2:
         - 🔄 Conversation history
         """)
 
+# ============== LIBRARY: CHAT ACROSS MANY PDFS ==============
+with tab_library:
+    st.header("📚 Document Library")
+    st.markdown("Add many PDFs and ask questions across all of them at once")
+    
+    # Add documents
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        library_files = st.file_uploader(
+            "📤 Add PDFs to the library:",
+            type=["pdf"],
+            accept_multiple_files=True,
+            key="library_uploader"
+        )
+    with col2:
+        new_tags = st.text_input(
+            "Tags (comma-separated):",
+            placeholder="e.g., hr, policies",
+            key="library_tags"
+        )
+    
+    if library_files and st.button("➕ Add to Library", use_container_width=True):
+        tags = [tag.strip().lower() for tag in new_tags.split(",") if tag.strip()]
+        progress = st.progress(0.0, text="📖 Indexing documents...")
+        added = 0
+        for idx, library_file in enumerate(library_files, 1):
+            if add_document(spool_upload(library_file), tags):
+                added += 1
+            else:
+                st.warning(f"⚠️ Could not index {library_file.name}")
+            progress.progress(idx / len(library_files), text=f"📖 Indexed {idx}/{len(library_files)}")
+        st.success(f"✅ Added {added} document(s) to the library")
+    
+    library_docs = list_documents()
+    
+    if not library_docs:
+        st.info("👆 Add PDF documents to build your library")
+    else:
+        st.divider()
+        
+        with st.expander(f"🗂️ Manage documents ({len(library_docs)})"):
+            for doc in library_docs:
+                col1, col2 = st.columns([5, 1])
+                with col1:
+                    st.markdown(f"**{doc['name']}** | {doc['characters']:,} chars | 🏷️ {', '.join(doc['tags']) or 'no tags'}")
+                with col2:
+                    if st.button("🗑️ Remove", key=f"library_remove_{doc['file_hash']}", use_container_width=True):
+                        remove_document(doc["file_hash"])
+                        selected = st.session_state.get("library_filter_docs", [])
+                        st.session_state.library_filter_docs = [h for h in selected if h != doc["file_hash"]]
+                        st.rerun()
+        
+        # Filters - resolved against document metadata, so unselected shards are never searched
+        col1, col2, col3 = st.columns([2, 2, 1])
+        with col1:
+            filter_tags = st.multiselect("🏷️ Filter by tags:", all_tags(), key="library_filter_tags")
+        with col2:
+            filter_docs = st.multiselect(
+                "📄 Filter by document:",
+                [doc["file_hash"] for doc in library_docs],
+                format_func=lambda file_hash: next(
+                    doc["name"] for doc in library_docs if doc["file_hash"] == file_hash
+                ),
+                key="library_filter_docs"
+            )
+        with col3:
+            st.metric("📚 Documents", len(library_docs))
+        
+        # Question input
+        col1, col2 = st.columns([4, 1])
+        with col1:
+            library_question = st.text_input(
+                "Your question:",
+                placeholder="e.g., What do our manuals say about data retention?",
+                key="library_question",
+                label_visibility="collapsed"
+            )
+        with col2:
+            library_ask = st.button("🚀 Ask", type="primary", use_container_width=True, key="library_ask")
+        
+        if library_ask and library_question.strip():
+            with st.spinner("🔎 Searching the library..."):
+                start_time = datetime.now()
+                answer, source_docs = chat_with_library(
+                    library_question,
+                    tags=filter_tags,
+                    file_hashes=filter_docs
+                )
+                duration = (datetime.now() - start_time).total_seconds()
+            
+            st.session_state.library_history.append((library_question, answer))
+            st.success(f"✅ Answer generated in {duration:.2f} seconds")
+            
+            if source_docs:
+                with st.expander("📚 View Source Excerpts"):
+                    for idx, doc in enumerate(source_docs, 1):
+                        st.markdown(f"**Source {idx}:** {doc.metadata['source']}")
+                        st.text(truncate_text(doc.page_content, 200))
+                        st.divider()
+        
+        elif library_ask:
+            st.warning("⚠️ Please enter a question!")
+        
+        # Newest turns first
+        for question, answer in reversed(st.session_state.library_history.tail(HISTORY_PAGE_SIZE)):
+            render_turn(question, answer)
+
 # ============== TAB 3: HELP & INFORMATION ==============
 with tab3:
     st.header("ℹ️ Help & Information")
@@ -503,7 +706,7 @@ with tab3:
     - Check file isn't corrupted
     
     **Slow Performance:**
-    - First query takes longer (builds index)
+    - Indexing starts as soon as a PDF is uploaded; the first answer waits only for what is left
     - Subsequent queries use cache
     - Clear cache if experiencing issues
     """)
@@ -0,0 +1,101 @@
+"""
+Benchmark embedding backends against the PyTorch baseline.
+
+Reports document throughput, single-query latency and how closely each
+backend agrees with PyTorch (vector cosine and top-k retrieval overlap).
+
+Usage:
+    python bench_embeddings.py [path/to/file.pdf] [--threads N] [--top-k K]
+"""
+import argparse
+import time
+import numpy as np
+from embeddings import build_embeddings
+from chat_pdf import text_splitter
+from utils import extract_pages
+
+BACKENDS = ["torch", "onnx", "onnx-int8"]
+QUERY_COUNT = 20
+
+SAMPLE_TOPICS = [
+    "quarterly revenue grew in the northern region",
+    "the employee handbook describes paid leave policies",
+    "safety procedures for operating heavy machinery",
+    "the study found a significant effect of sleep on memory",
+    "network outages were traced to a misconfigured router",
+    "the contract terminates after twelve months unless renewed",
+    "customer satisfaction scores improved after the redesign",
+    "the committee approved the new research budget",
+]
+
+
+def load_corpus(pdf_path=None, synthetic_chunks=200):
+    """Chunks from a PDF, or a synthetic corpus when no file is given."""
+    if pdf_path:
+        text = "\n".join(extract_pages(pdf_path))
+        return text_splitter.split_text(text)
+    rng = np.random.default_rng(0)
+    return [
+        " ".join(rng.choice(SAMPLE_TOPICS, size=6)) + f" (section {idx})."
+        for idx in range(synthetic_chunks)
+    ]
+
+
+def time_call(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def top_k(doc_vectors, query_vectors, k):
+    scores = query_vectors @ doc_vectors.T
+    return np.argsort(-scores, axis=1)[:, :k]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pdf", nargs="?", help="PDF to take chunks from (default: synthetic text)")
+    parser.add_argument("--threads", type=int, default=0, help="Intra-op threads (0 = runtime default)")
+    parser.add_argument("--top-k", type=int, default=3, help="k for retrieval agreement")
+    args = parser.parse_args()
+
+    chunks = load_corpus(args.pdf)
+    queries = [chunk[:100] for chunk in chunks[:QUERY_COUNT]]  # Chunk openings as queries
+    print(f"Corpus: {len(chunks)} chunks | {len(queries)} queries | threads={args.threads or 'auto'}\n")
+
+    results = {}
+    for backend in BACKENDS:
+        try:
+            model, load_s = time_call(build_embeddings, backend, args.threads)
+        except Exception as e:
+            print(f"{backend:>10}: skipped ({e})")
+            continue
+        model.embed_documents(chunks[:8])  # Warm-up
+        docs, docs_s = time_call(model.embed_documents, chunks)
+        latencies = [time_call(model.embed_query, q)[1] for q in queries]
+        results[backend] = {
+            "docs": np.asarray(docs, dtype=np.float32),
+            "queries": np.asarray([model.embed_query(q) for q in queries], dtype=np.float32),
+            "load_s": load_s,
+            "docs_per_s": len(chunks) / docs_s,
+            "query_ms": 1000 * float(np.median(latencies)),
+        }
+
+    if "torch" not in results:
+        print("PyTorch baseline unavailable - agreement not computed.")
+    baseline = results.get("torch")
+
+    print(f"{'backend':>10} {'load s':>8} {'docs/s':>9} {'query ms':>9} {'cosine':>8} {'top-k overlap':>14}")
+    for backend, r in results.items():
+        cosine = overlap = float("nan")
+        if baseline is not None:
+            cosine = float(np.mean(np.sum(r["docs"] * baseline["docs"], axis=1)))
+            ours = top_k(r["docs"], r["queries"], args.top_k)
+            ref = top_k(baseline["docs"], baseline["queries"], args.top_k)
+            overlap = float(np.mean([len(set(a) & set(b)) / args.top_k for a, b in zip(ours, ref)]))
+        print(f"{backend:>10} {r['load_s']:>8.2f} {r['docs_per_s']:>9.1f} {r['query_ms']:>9.2f} "
+              f"{cosine:>8.4f} {overlap:>14.2%}")
+
+
+if __name__ == "__main__":
+    main()
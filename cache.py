@@ -0,0 +1,285 @@
+import os
+import sys
+import time
+import threading
+from collections import OrderedDict
+from diskcache import Cache, Lock
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Cache configuration (override via environment)
+CACHE_DIR = os.getenv("CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache"))
+CACHE_MEMORY_MB = int(os.getenv("CACHE_MEMORY_MB", "256"))
+CACHE_DISK_MB = int(os.getenv("CACHE_DISK_MB", "2048"))
+CACHE_TTL = int(os.getenv("CACHE_TTL", str(24 * 3600)))  # Seconds
+VECTORSTORE_MEMORY_MB = int(os.getenv("VECTORSTORE_MEMORY_MB", "512"))
+VECTORSTORE_MAX_ENTRIES = int(os.getenv("VECTORSTORE_MAX_ENTRIES", "64"))  # Backstop if size estimates are off
+VECTORSTORE_DIR = os.path.join(CACHE_DIR, "vectorstores")  # Per-document indexes and summary trees
+LOCK_EXPIRE = 600  # Seconds before a lock left by a crashed process is released
+
+
+def approx_size(value):
+    """Rough in-memory size of a cached value in bytes."""
+    if isinstance(value, str):
+        return len(value.encode("utf-8", errors="ignore"))
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, (list, tuple, set)):
+        return sys.getsizeof(value) + sum(approx_size(item) for item in value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(
+            approx_size(k) + approx_size(v) for k, v in value.items()
+        )
+    nbytes = getattr(value, "nbytes", None)  # NumPy arrays
+    if nbytes is not None:
+        return int(nbytes)
+    return sys.getsizeof(value)
+
+
+class TieredCache:
+    """
+    Process-wide two-tier cache: an in-memory LRU in front of a disk cache.
+
+    Values evicted from memory stay on disk, so a later lookup is still a hit
+    (just a slower one). Both tiers are size-capped and entries expire after
+    `ttl` seconds. Safe to share between Streamlit sessions (threads).
+    """
+
+    def __init__(self, directory=CACHE_DIR, memory_mb=CACHE_MEMORY_MB,
+                 disk_mb=CACHE_DISK_MB, ttl=CACHE_TTL):
+        self.max_memory = memory_mb * 1024 * 1024
+        self.ttl = ttl
+        self._memory = OrderedDict()  # key -> (value, size, expires_at)
+        self._memory_bytes = 0
+        self._lock = threading.RLock()
+        self._disk = Cache(
+            directory,
+            size_limit=disk_mb * 1024 * 1024,
+            eviction_policy="least-recently-used"
+        )
+        self.stats = {"hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+
+    def __contains__(self, key):
+        """True if `key` is held and unexpired in either tier (no stats, no promotion)."""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and entry[2] > time.time():
+                return True
+        return key in self._disk
+
+    def get(self, key, default=None):
+        """Look up `key` in memory, then on disk."""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, size, expires_at = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self.stats["hits"] += 1
+                    return value
+                self._drop(key)
+                self.stats["evictions"] += 1
+
+        value, expires_at = self._disk.get(key, default=_MISSING, expire_time=True)
+        if value is _MISSING:
+            with self._lock:
+                self.stats["misses"] += 1
+            return default
+
+        # Promote to memory for the next lookup, for the rest of its disk lifetime
+        with self._lock:
+            self.stats["hits"] += 1
+            self.stats["disk_hits"] += 1
+        if expires_at is None or expires_at > now:
+            self._remember(key, value, (expires_at - now) if expires_at else None)
+        return value
+
+    def set(self, key, value, ttl=None):
+        """Store `value` in both tiers (for `ttl` seconds, default the cache's TTL)."""
+        ttl = ttl or self.ttl
+        self._remember(key, value, ttl)
+        self._disk.set(key, value, expire=ttl)
+
+    def get_or_compute(self, key, compute):
+        """Return the cached value for `key`, computing and storing it on a miss."""
+        value = self.get(key, default=_MISSING)
+        if value is _MISSING:
+            value = compute()
+            if value is not None:
+                self.set(key, value)
+        return value
+
+    def delete(self, key):
+        """Remove `key` from both tiers."""
+        with self._lock:
+            self._drop(key)
+        self._disk.delete(key)
+
+    def clear(self):
+        """Empty both tiers and reset counters."""
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+            self.stats = {k: 0 for k in self.stats}
+        self._disk.clear()
+
+    def snapshot(self):
+        """Counters and footprint for display."""
+        with self._lock:
+            stats = dict(self.stats)
+            stats["memory_entries"] = len(self._memory)
+            stats["memory_bytes"] = self._memory_bytes
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        stats["disk_bytes"] = self._disk.volume()
+        return stats
+
+    def _remember(self, key, value, ttl=None):
+        size = approx_size(value)
+        if size > self.max_memory:
+            return  # Too big for memory - disk tier only
+        with self._lock:
+            self._drop(key)
+            self._memory[key] = (value, size, time.time() + (ttl or self.ttl))
+            self._memory_bytes += size
+            while self._memory_bytes > self.max_memory:
+                oldest = next(iter(self._memory))
+                self._drop(oldest)
+                self.stats["evictions"] += 1
+
+    def _drop(self, key):
+        entry = self._memory.pop(key, None)
+        if entry is not None:
+            self._memory_bytes -= entry[1]
+
+
+class ResourceCache:
+    """
+    LRU cache for heavyweight live objects (e.g. vector stores) with a byte ceiling.
+
+    Callers supply the approximate size of each entry. When the total goes
+    over `max_bytes` (or there are more than `max_entries` entries),
+    least-recently-used entries are dropped and their
+    `on_evict` callback runs so the owner can release them; they are
+    reloaded or rebuilt on the next request.
+
+    Objects taken with `acquire` (or `put(..., lease=True)`) are leased:
+    if they are evicted while leased, `on_evict` is deferred until the
+    last `release`, so nobody's in-flight query loses its object.
+    """
+
+    def __init__(self, max_mb=VECTORSTORE_MEMORY_MB, max_entries=VECTORSTORE_MAX_ENTRIES):
+        self.max_bytes = max_mb * 1024 * 1024
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (value, size, on_evict)
+        self._bytes = 0
+        self._leases = {}  # id(value) -> active lease count
+        self._pending = {}  # id(value) -> (value, on_evict) evicted while leased
+        self._lock = threading.RLock()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def get(self, key):
+        """Return the live object for `key`, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return entry[0]
+
+    def acquire(self, key):
+        """Like `get`, but lease the object until `release` is called with it."""
+        with self._lock:
+            value = self.get(key)
+            if value is not None:
+                self._leases[id(value)] = self._leases.get(id(value), 0) + 1
+            return value
+
+    def release(self, value):
+        """End a lease; runs the deferred `on_evict` if this was the last one."""
+        with self._lock:
+            count = self._leases.get(id(value), 0) - 1
+            if count > 0:
+                self._leases[id(value)] = count
+                return
+            self._leases.pop(id(value), None)
+            pending = self._pending.pop(id(value), None)
+        if pending and pending[1]:
+            pending[1](pending[0])
+
+    def put(self, key, value, size, on_evict=None, lease=False):
+        """Track `value` at `size` bytes, evicting older entries to fit (optionally leasing it)."""
+        evicted = []
+        with self._lock:
+            if lease:
+                self._leases[id(value)] = self._leases.get(id(value), 0) + 1
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+                if old[0] is not value:
+                    evicted.append(old)
+            self._entries[key] = (value, size, on_evict)
+            self._bytes += size
+            # Always keep the newest entry, even if it alone exceeds the cap
+            while len(self._entries) > 1 and (self._bytes > self.max_bytes or len(self._entries) > self.max_entries):
+                _, entry = self._entries.popitem(last=False)
+                self._bytes -= entry[1]
+                self.stats["evictions"] += 1
+                evicted.append(entry)
+            evicted = self._defer_leased(evicted)
+        for value, _, callback in evicted:
+            if callback:
+                callback(value)
+
+    def clear(self):
+        """Release every entry (leased ones once their last lease ends)."""
+        with self._lock:
+            entries = self._defer_leased(list(self._entries.values()))
+            self._entries.clear()
+            self._bytes = 0
+        for value, _, callback in entries:
+            if callback:
+                callback(value)
+
+    def _defer_leased(self, entries):
+        """Park leased entries until released; return the ones safe to release now."""
+        ready = []
+        for entry in entries:
+            value, _, callback = entry
+            if self._leases.get(id(value)):
+                self._pending[id(value)] = (value, callback)
+            else:
+                ready.append(entry)
+        return ready
+
+    def snapshot(self):
+        """Counters and footprint for display."""
+        with self._lock:
+            stats = dict(self.stats)
+            stats["entries"] = len(self._entries)
+            stats["pending_release"] = len(self._pending)
+            stats["bytes"] = self._bytes
+            stats["max_bytes"] = self.max_bytes
+            stats["max_entries"] = self.max_entries
+        return stats
+
+
+def process_lock(name, expire=LOCK_EXPIRE):
+    """A lock held across every process using CACHE_DIR (API workers, replicas on a shared volume)."""
+    return Lock(_lock_store, name, expire=expire)
+
+
+_MISSING = object()
+
+# Shared by every session in this process
+shared_cache = TieredCache()
+vectorstore_cache = ResourceCache()
+_lock_store = Cache(os.path.join(CACHE_DIR, "locks"))  # Separate from shared_cache so locks are never evicted
@@ -1,16 +1,29 @@
 
 import os
+import logging
+import threading
+from collections import defaultdict, OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 from langchain.prompts import PromptTemplate
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 import google.generativeai as genai
-from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_community.vectorstores import Chroma
+from langchain_core.documents import Document
 from PyPDF2 import PdfReader
 import streamlit as st
 from dotenv import load_dotenv
+from utils import count_tokens, read_pdf_cached
+from cache import shared_cache, vectorstore_cache, process_lock, VECTORSTORE_DIR
+from embeddings import get_embeddings, model_bytes, embedding_dim
+from scheduler import scheduler, PRIORITY_INTERACTIVE, is_rate_limit_error
+from section_index import ensure_summary_tree, is_broad_question, load_summary_tree, overview_documents
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 API_KEY = os.getenv("GEMINI_API_KEY")
 
 # Initialize Gemini directly
@@ -20,14 +33,24 @@ if API_KEY:
 else:
     model = None
 
+CHUNK_OVERLAP = 100
+
 # OPTIMIZED text splitter - larger chunks = fewer embeddings
 text_splitter = RecursiveCharacterTextSplitter(
     chunk_size=2000,  # Larger chunks
-    chunk_overlap=100,  # Minimal overlap
+    chunk_overlap=CHUNK_OVERLAP,  # Minimal overlap
     length_function=len,
     separators=["\n\n\n", "\n\n", "\n", ". ", " "]
 )
 
+# Context selection - over-fetch, then keep diverse chunks up to a token budget
+CONTEXT_FETCH_K = 10  # Candidates pulled from the index
+CONTEXT_MAX_DOCS = 4  # Max chunks sent to the model
+CONTEXT_TOKEN_BUDGET = 1500  # Approximate prompt tokens spent on context
+MMR_LAMBDA = 0.6  # 1.0 = pure relevance, 0.0 = pure diversity
+DUPLICATE_THRESHOLD = 0.95  # Cosine similarity above which chunks count as duplicates
+MIN_OVERLAP = 20  # Shortest repeated head/tail treated as splitter overlap
+
 
 def read_pdf(file_path):
     """Extract text from PDF."""
@@ -44,71 +67,396 @@ def read_pdf(file_path):
         return ""
 
 
-@st.cache_resource(show_spinner=False)
-def create_vectorstore(_file_hash, text):
+# Rough memory accounting for cached vector stores
+FLOAT_BYTES = 4
+INDEX_OVERHEAD = 2  # HNSW graph + ids roughly double the raw vectors
+STORE_OVERHEAD_BYTES = 4 * 1024 * 1024  # Per open Chroma client - measured ~4 MB RSS each (chromadb 1.x)
+
+_build_locks = defaultdict(threading.Lock)
+_build_locks_guard = threading.Lock()
+
+# Background indexing started as soon as a PDF is uploaded
+PREWARM_WORKERS = int(os.getenv("PREWARM_WORKERS", "2"))
+_prewarm_pool = ThreadPoolExecutor(max_workers=PREWARM_WORKERS, thread_name_prefix="prewarm")
+_prewarming = {}  # file_hash -> Future
+_prewarm_results = OrderedDict()  # file_hash -> notices from its last background build
+_prewarming_lock = threading.Lock()
+MAX_PREWARM_RESULTS = 256  # Documents whose build notices are kept for display
+
+# Canned questions offered in the UI - their embeddings are computed during prewarm
+SUGGESTED_QUESTIONS = [
+    "Can you provide a summary of this document?",
+    "What are the key points in this document?",
+    "What are the main findings or conclusions?",
+    "Who are the main people or entities mentioned?",
+]
+
+
+def _estimate_store_bytes(texts, dim):
+    """Approximate resident size of a vector store: vectors, index and texts."""
+    vector_bytes = len(texts) * dim * FLOAT_BYTES * INDEX_OVERHEAD
+    text_bytes = sum(len(t.encode("utf-8", errors="ignore")) for t in texts)
+    return vector_bytes + text_bytes + STORE_OVERHEAD_BYTES
+
+
+def _collection_name(file_hash):
+    """One collection per document, named by the full hash so prefixes can't collide."""
+    return f"pdf_{file_hash}"
+
+
+def _vectorstore_path(file_hash):
+    return os.path.join(VECTORSTORE_DIR, file_hash)
+
+
+def _load_vectorstore(file_hash, embeddings):
+    """Reopen a previously persisted vector store, or None if there isn't one."""
+    path = _vectorstore_path(file_hash)
+    if not os.path.isdir(path):
+        return None
+    vectorstore = Chroma(
+        collection_name=_collection_name(file_hash),
+        embedding_function=embeddings,
+        persist_directory=path
+    )
+    if vectorstore._collection.count() == 0:
+        return None
+    return vectorstore
+
+
+def _release_vectorstore(vectorstore):
+    """Free the Chroma client behind an evicted store; its data stays on disk."""
+    try:
+        # Refcounted: a store reopened for the same path shares the system and
+        # keeps it running; it stops only with its last client
+        vectorstore._client.close()
+    except Exception as e:
+        # Dropping the reference still lets GC reclaim it
+        logger.warning("Could not release vector store client: %s", e)
+
+
+def _build_lock(file_hash):
+    with _build_locks_guard:
+        return _build_locks[file_hash]
+
+
+def _stored_chunks(vectorstore):
+    """The store's chunk texts in document order."""
+    stored = vectorstore._collection.get(include=["documents", "metadatas"])
+    pairs = zip(stored["metadatas"], stored["documents"])
+    return [text for _, text in sorted(pairs, key=lambda pair: (pair[0] or {}).get("chunk", 0))]
+
+
+def _notify(notices, level, message):
+    """Show `message` with st.<level>, or collect it when running off the script thread."""
+    if notices is None:
+        getattr(st, level)(message)
+    else:
+        notices.append((level, message))
+
+
+def create_vectorstore(file_hash, text, lease=False, summary_tree=True, notices=None):
     """
-    Create and cache vectorstore for PDF - OPTIMIZED FOR SPEED.
-    Using _file_hash to avoid hashing issues with streamlit cache.
+    Create or reuse the vectorstore for a PDF - OPTIMIZED FOR SPEED.
+    
+    Live stores are kept in a memory-bounded LRU (`vectorstore_cache`).
+    Evicted stores are reopened from disk, or rebuilt if they were never
+    persisted. With `lease`, the store is leased from the cache and the
+    caller must hand it back with `vectorstore_cache.release` (see
+    `use_vectorstore`). With `summary_tree`, the document's summary tree
+    (LLM calls) is built in the background when the store is loaded.
+    `text` may be a callable, called only if the index has to be built.
+    Pass a `notices` list to collect (level, message) pairs instead of
+    calling st.* (background threads have no script context to show them).
     """
     try:
-        # SPEED OPTIMIZATION: Limit text length to prevent slow embedding
-        max_chars = 50000  # Process max 50k characters
-        if len(text) > max_chars:
-            text = text[:max_chars]
-            st.info(f"⚡ Processing first 50k characters for optimal speed")
-        
-        # Split text into chunks
-        chunks = text_splitter.split_text(text)
-        
-        # SPEED OPTIMIZATION: Limit number of chunks
-        max_chunks = 30  # Max 30 chunks for speed
-        if len(chunks) > max_chunks:
-            chunks = chunks[:max_chunks]
-            st.info(f"⚡ Using first {max_chunks} sections for fast processing")
-        
-        # Create embeddings with lightweight model
-        embeddings = HuggingFaceEmbeddings(
-            model_name="sentence-transformers/all-MiniLM-L6-v2",
-            model_kwargs={'device': 'cpu'},
-            encode_kwargs={'normalize_embeddings': True, 'batch_size': 8}
-        )
-        
-        # Create vectorstore
-        vectorstore = Chroma.from_texts(
-            texts=chunks,
-            embedding=embeddings,
-            collection_name=f"pdf_{_file_hash[:8]}"
-        )
-        
-        return vectorstore
+        # Threads of this process first, then other processes sharing CACHE_DIR
+        with _build_lock(file_hash), process_lock(("build_index", file_hash)):
+            vectorstore = (vectorstore_cache.acquire if lease else vectorstore_cache.get)(file_hash)
+            if vectorstore is not None:
+                return vectorstore
+            
+            embeddings = get_embeddings()
+            vectorstore = _load_vectorstore(file_hash, embeddings)
+            
+            if vectorstore is not None:
+                chunks = _stored_chunks(vectorstore)
+            else:
+                if callable(text):
+                    text = text() or ""  # Extracted only when there is nothing on disk to reopen
+                
+                # SPEED OPTIMIZATION: Limit text length to prevent slow embedding
+                max_chars = 50000  # Process max 50k characters
+                if len(text) > max_chars:
+                    text = text[:max_chars]
+                    _notify(notices, "info", "⚡ Processing first 50k characters for optimal speed")
+                
+                # Split text into chunks (shared across sessions)
+                chunks = shared_cache.get_or_compute(
+                    ("chunks", file_hash),
+                    lambda: text_splitter.split_text(text)
+                )
+                
+                # SPEED OPTIMIZATION: Limit number of chunks
+                max_chunks = 30  # Max 30 chunks for speed
+                if len(chunks) > max_chunks:
+                    chunks = chunks[:max_chunks]
+                    _notify(notices, "info", f"⚡ Using first {max_chunks} sections for fast processing")
+                
+                if not chunks:
+                    return None
+                
+                # Create vectorstore (persisted so eviction doesn't mean re-embedding)
+                vectorstore = Chroma.from_texts(
+                    texts=chunks,
+                    embedding=embeddings,
+                    metadatas=[{"chunk": idx} for idx in range(len(chunks))],
+                    collection_name=_collection_name(file_hash),
+                    persist_directory=_vectorstore_path(file_hash)
+                )
+            
+            vectorstore_cache.put(
+                file_hash,
+                vectorstore,
+                _estimate_store_bytes(chunks, embedding_dim(embeddings)),
+                on_evict=_release_vectorstore,
+                lease=lease
+            )
+            
+            # Precompute chunk -> section -> document summaries in the background
+            if summary_tree:
+                ensure_summary_tree(file_hash, chunks, model)
+            return vectorstore
         
     except Exception as e:
-        st.error(f"Error creating search index: {str(e)}")
+        _notify(notices, "error", f"Error creating search index: {str(e)}")
         return None
 
 
+@contextmanager
+def use_vectorstore(file_hash, text):
+    """
+    Yield the document's vector store for querying.
+
+    The store stays open until the block exits, even if another session
+    evicts it from the LRU in the meantime. Yields None if it can't be built.
+    """
+    vectorstore = create_vectorstore(file_hash, text, lease=True)
+    try:
+        yield vectorstore
+    finally:
+        if vectorstore is not None:
+            vectorstore_cache.release(vectorstore)
+
+
+def get_vectorstore_footprint():
+    """Approximate memory held by cached vector stores plus the shared model."""
+    stats = vectorstore_cache.snapshot()
+    stats["model_bytes"] = model_bytes(get_embeddings()) if stats["entries"] else 0
+    stats["total_bytes"] = stats["bytes"] + stats["model_bytes"]
+    return stats
+
+
+def _build_index(file_path, file_hash):
+    """
+    Extract, chunk and embed a document, then warm the suggested-question embeddings.
+
+    Runs on a pool thread, so messages for the user are returned as
+    (level, message) notices for the script thread to show.
+    """
+    notices = []
+    try:
+        text = read_pdf_cached(file_path, file_hash)
+        if not text or not text.strip():
+            notices.append(("error", "❌ Could not extract text from PDF."))
+            return notices
+        vectorstore = create_vectorstore(file_hash, text, notices=notices)
+        if vectorstore is not None:
+            embeddings = get_embeddings()
+            for question in SUGGESTED_QUESTIONS:
+                embeddings.embed_query(question)
+    except Exception as e:
+        notices.append(("error", f"Error creating search index: {str(e)}"))
+    return notices
+
+
+def _finish_prewarm(file_hash, future):
+    with _prewarming_lock:
+        _prewarming.pop(file_hash, None)
+        _prewarm_results[file_hash] = future.result()  # _build_index never raises
+        while len(_prewarm_results) > MAX_PREWARM_RESULTS:
+            _prewarm_results.popitem(last=False)
+
+
+def prewarm_index(file_path, file_hash):
+    """Start building the document's index in the background (no-op if ready or underway)."""
+    if file_hash in vectorstore_cache:
+        return
+    with _prewarming_lock:
+        if file_hash in _prewarming:
+            return
+        _prewarm_results.pop(file_hash, None)  # Don't show the previous build's notices
+        future = _prewarm_pool.submit(_build_index, file_path, file_hash)
+        _prewarming[file_hash] = future
+    future.add_done_callback(lambda done: _finish_prewarm(file_hash, done))
+
+
+def is_index_ready(file_hash):
+    """True once the document's vector store is live in memory."""
+    return file_hash in vectorstore_cache
+
+
+def index_status(file_hash):
+    """
+    State of the document's index for display.
+
+    Returns:
+        (state, notices) - state is 'ready', 'indexing', 'failed' or 'idle'
+        (not loaded; built on the next question), notices are the
+        (level, message) pairs from the last background build
+    """
+    with _prewarming_lock:
+        running = file_hash in _prewarming
+        notices = list(_prewarm_results.get(file_hash, []))
+    if is_index_ready(file_hash):
+        return "ready", notices
+    if running:
+        return "indexing", notices
+    if any(level == "error" for level, _ in notices):
+        return "failed", notices
+    return "idle", notices
+
+
+def _wait_for_prewarm(file_hash):
+    """Block until a background build of this document (if any) finishes."""
+    with _prewarming_lock:
+        future = _prewarming.get(file_hash)
+    if future is not None:
+        try:
+            future.result()
+        except Exception:
+            pass  # The foreground path below retries and reports the error
+
+
+def _mmr_order(query_embedding, embeddings, lambda_mult=MMR_LAMBDA):
+    """Yield candidate indices in maximal-marginal-relevance order."""
+    relevance = embeddings @ query_embedding
+    selected = []
+    remaining = list(range(len(embeddings)))
+    while remaining:
+        if selected:
+            redundancy = (embeddings[remaining] @ embeddings[selected].T).max(axis=1)
+        else:
+            redundancy = np.zeros(len(remaining))
+        scores = lambda_mult * relevance[remaining] - (1 - lambda_mult) * redundancy
+        best = remaining.pop(int(np.argmax(scores)))
+        selected.append(best)
+        yield best
+
+
+def _strip_overlap(previous, text, max_overlap=CHUNK_OVERLAP, min_overlap=MIN_OVERLAP):
+    """
+    Drop the head of `text` that repeats the tail of `previous`.
+
+    Only matches of at least `min_overlap` characters that end on a word
+    boundary count; shorter ones are usually coincidence (chunks split at
+    paragraph breaks have no overlap at all).
+    """
+    for size in range(min(max_overlap, len(previous), len(text)), min_overlap - 1, -1):
+        at_boundary = size == len(text) or not (text[size - 1].isalnum() and text[size].isalnum())
+        if at_boundary and previous.endswith(text[:size]):
+            return text[size:].lstrip()
+    return text
+
+
+def select_context(vectorstore, query, k=CONTEXT_MAX_DOCS, fetch_k=CONTEXT_FETCH_K,
+                   token_budget=CONTEXT_TOKEN_BUDGET):
+    """
+    Pick a compact, non-redundant set of chunks for the prompt.
+    
+    Over-fetches `fetch_k` candidates, walks them in MMR order, skips
+    near-duplicates, trims text shared with adjacent chunks and stops once
+    the token budget is spent.
+    
+    Returns:
+        List of Documents in document order
+    """
+    query_embedding = np.asarray(vectorstore.embeddings.embed_query(query))
+    results = vectorstore._collection.query(
+        query_embeddings=[query_embedding.tolist()],
+        n_results=fetch_k,
+        include=["documents", "metadatas", "embeddings"]
+    )
+    texts = results["documents"][0]
+    if not texts:
+        return []
+    metadatas = results["metadatas"][0]
+    embeddings = np.asarray(results["embeddings"][0])
+    
+    picked = []
+    used_tokens = 0
+    for idx in _mmr_order(query_embedding, embeddings):
+        if len(picked) >= k:
+            break
+        if picked and (embeddings[picked] @ embeddings[idx]).max() > DUPLICATE_THRESHOLD:
+            continue
+        tokens = count_tokens(texts[idx])
+        if picked and used_tokens + tokens > token_budget:
+            continue
+        picked.append(idx)
+        used_tokens += tokens
+    
+    picked.sort(key=lambda i: (metadatas[i] or {}).get("chunk", i))
+    docs = []
+    previous = None
+    for idx in picked:
+        text = texts[idx]
+        chunk = (metadatas[idx] or {}).get("chunk")
+        if previous is not None and chunk is not None and chunk == previous[0] + 1:
+            text = _strip_overlap(previous[1], text)
+        previous = (chunk, texts[idx]) if chunk is not None else None
+        docs.append(Document(page_content=text, metadata=metadatas[idx] or {}))
+    return docs
+
+
 def chat_with_pdf(file_path, query, file_hash, chat_history=None):
     """
     Chat with PDF using direct Gemini API and RAG.
+    
+    Document-level questions ("summarize this", "main findings?") are
+    answered from the precomputed summary tree when it is ready.
     """
     try:
         if not model:
             return "❌ Gemini API key not configured.", []
+        
+        # Only wait for whatever indexing work the upload-time prewarm has left
+        _wait_for_prewarm(file_hash)
             
-        # Read PDF
-        text = read_pdf(file_path)
+        # Read PDF (cached per file hash)
+        text = read_pdf_cached(file_path, file_hash)
         
         if not text or text.strip() == "":
             return "❌ Could not extract text from PDF.", []
         
-        # Create or retrieve cached vectorstore
-        vectorstore = create_vectorstore(file_hash, text)
-        
-        if not vectorstore:
-            return "❌ Error creating search index.", []
-        
-        # Get relevant documents
-        docs = vectorstore.similarity_search(query, k=3)
+        # Create or retrieve cached vectorstore (held open while we query it)
+        with use_vectorstore(file_hash, text) as vectorstore:
+            if not vectorstore:
+                return "❌ Error creating search index.", []
+            
+            # Broad questions use the document/section summaries; others use retrieval
+            tree = None
+            if is_broad_question(query):
+                tree = load_summary_tree(file_hash)
+                if tree is None:
+                    # Not built yet (e.g. store opened for the library) - start it for next time
+                    ensure_summary_tree(file_hash, _stored_chunks(vectorstore), model)
+            if tree:
+                docs = overview_documents(tree)
+                instruction = 'Answer the question based on the document overview below. If the answer is not in the overview, say "Not found in document."'
+            else:
+                # Get relevant, non-redundant documents within the token budget
+                docs = select_context(vectorstore, query)
+                instruction = 'Answer the question based on the context below. If the answer is not in the context, say "Not found in document."'
         
         if not docs:
             return "❌ No relevant information found in the PDF.", []
@@ -117,7 +465,7 @@ def chat_with_pdf(file_path, query, file_hash, chat_history=None):
         context = "\n\n".join([doc.page_content for doc in docs])
         
         # Create prompt
-        prompt = f"""Answer the question based on the context below. If the answer is not in the context, say "Not found in document."
+        prompt = f"""{instruction}
 
 Context:
 {context}
@@ -126,8 +474,8 @@ Question: {query}
 
 Answer:"""
         
-        # Get answer from Gemini
-        response = model.generate_content(prompt)
+        # Get answer from Gemini (interactive priority in the shared scheduler)
+        response = scheduler.generate(model, prompt, priority=PRIORITY_INTERACTIVE)
         answer = response.text.strip() if response.text else "No response generated."
         
         return answer, docs
@@ -136,7 +484,7 @@ Answer:"""
         error_msg = str(e)
         if "timeout" in error_msg.lower():
             return "⏱️ Request timed out. Please try again.", []
-        elif "rate limit" in error_msg.lower():
+        elif is_rate_limit_error(e):
             return "🚫 Rate limit reached. Wait a moment.", []
         return f"❌ Error: {error_msg}", []
 
@@ -146,8 +494,9 @@ def get_conversation_summary(chat_history):
     if not chat_history or len(chat_history) == 0:
         return "No conversation yet."
     
+    recent = chat_history.tail(3) if hasattr(chat_history, "tail") else chat_history[-3:]
     summary = f"Total exchanges: {len(chat_history)}\n\n"
-    for idx, (q, a) in enumerate(chat_history[-3:], 1):  # Last 3 exchanges
+    for idx, (q, a) in enumerate(recent, 1):  # Last 3 exchanges
         summary += f"Q{idx}: {q[:100]}...\n"
     
     return summary
\ No newline at end of file
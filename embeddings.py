@@ -0,0 +1,228 @@
+import os
+import inspect
+import threading
+from collections import OrderedDict
+import numpy as np
+import streamlit as st
+from dotenv import load_dotenv
+from langchain_core.embeddings import Embeddings
+from langchain_huggingface import HuggingFaceEmbeddings
+from cache import CACHE_DIR
+
+load_dotenv()
+
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+# Backend selection (override via environment)
+# 'torch' = sentence-transformers on PyTorch, 'onnx' = ONNX Runtime fp32,
+# 'onnx-int8' = ONNX Runtime with dynamic int8 quantization
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", "0"))  # 0 = let the runtime decide
+EMBEDDING_BATCH_SIZE = 8
+ONNX_DIR = os.path.join(CACHE_DIR, "onnx")
+MAX_SEQ_LENGTH = 256  # Same truncation as the sentence-transformers model
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "512"))  # Query embeddings kept in memory
+
+DEFAULT_MODEL_BYTES = 90 * 1024 * 1024  # all-MiniLM-L6-v2 in float32
+DEFAULT_EMBEDDING_DIM = 384
+
+
+def _encoder_for_export(model):
+    """Wrap a transformer so its forward takes exactly the exported inputs, positionally."""
+    import torch
+
+    class EncoderForExport(torch.nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.model = model
+
+        def forward(self, input_ids, attention_mask, token_type_ids):
+            return self.model(
+                input_ids=input_ids,
+                attention_mask=attention_mask,
+                token_type_ids=token_type_ids
+            ).last_hidden_state
+
+    return EncoderForExport()
+
+
+def export_onnx(model_name=EMBEDDING_MODEL, quantize=False, output_dir=ONNX_DIR):
+    """
+    Export the transformer behind `model_name` to ONNX (once) and return its path.
+
+    Pooling and normalisation are done in NumPy, so only the encoder is exported.
+    With `quantize`, an int8 dynamically quantized copy is produced as well.
+    """
+    model_dir = os.path.join(output_dir, model_name.replace("/", "__"))
+    fp32_path = os.path.join(model_dir, "model.onnx")
+    int8_path = os.path.join(model_dir, "model.int8.onnx")
+
+    if not os.path.exists(fp32_path):
+        import torch
+        from transformers import AutoModel, AutoTokenizer
+
+        os.makedirs(model_dir, exist_ok=True)
+        tokenizer = AutoTokenizer.from_pretrained(model_name)
+        model = AutoModel.from_pretrained(model_name).eval()
+        sample = tokenizer(["export sample"], return_tensors="pt")
+        names = ["input_ids", "attention_mask", "token_type_ids"]
+        dynamic = {name: {0: "batch", 1: "sequence"} for name in names}
+        dynamic["last_hidden_state"] = {0: "batch", 1: "sequence"}
+        export_kwargs = dict(
+            input_names=names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic,
+            opset_version=14
+        )
+        tmp_path = f"{fp32_path}.{os.getpid()}.part"
+        if "dynamo" in inspect.signature(torch.onnx.export).parameters:
+            export_kwargs["dynamo"] = False  # TorchScript exporter, no onnxscript needed
+        with torch.no_grad():
+            args = tuple(sample[name] for name in names)
+            torch.onnx.export(_encoder_for_export(model), args, tmp_path, **export_kwargs)
+        tokenizer.save_pretrained(model_dir)
+        os.replace(tmp_path, fp32_path)
+
+    if not quantize:
+        return fp32_path
+
+    if not os.path.exists(int8_path):
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+
+        tmp_path = f"{int8_path}.{os.getpid()}.part"
+        quantize_dynamic(fp32_path, tmp_path, weight_type=QuantType.QInt8)
+        os.replace(tmp_path, int8_path)
+    return int8_path
+
+
+class OnnxEmbeddings(Embeddings):
+    """
+    all-MiniLM-L6-v2 on ONNX Runtime - drop-in for HuggingFaceEmbeddings.
+
+    Produces the same mean-pooled, L2-normalised vectors as the
+    sentence-transformers pipeline.
+    """
+
+    def __init__(self, model_name=EMBEDDING_MODEL, quantize=False, threads=EMBEDDING_THREADS,
+                 batch_size=EMBEDDING_BATCH_SIZE):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        self.model_path = export_onnx(model_name, quantize=quantize)
+        self.tokenizer = AutoTokenizer.from_pretrained(os.path.dirname(self.model_path))
+        self.batch_size = batch_size
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(
+            self.model_path, sess_options=options, providers=["CPUExecutionProvider"]
+        )
+        self._input_names = {i.name for i in self.session.get_inputs()}
+
+    def _encode(self, texts):
+        batch = self.tokenizer(
+            texts, padding=True, truncation=True, max_length=MAX_SEQ_LENGTH, return_tensors="np"
+        )
+        feed = {name: batch[name].astype(np.int64) for name in self._input_names if name in batch}
+        hidden = self.session.run(None, feed)[0]
+
+        # Mean pooling over real tokens, then L2 normalisation
+        mask = batch["attention_mask"][..., None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        return pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+
+    def embed_documents(self, texts):
+        vectors = [
+            self._encode(list(texts[start:start + self.batch_size]))
+            for start in range(0, len(texts), self.batch_size)
+        ]
+        return np.vstack(vectors).tolist() if vectors else []
+
+    def embed_query(self, text):
+        return self._encode([text])[0].tolist()
+
+
+def build_embeddings(backend=EMBEDDING_BACKEND, threads=EMBEDDING_THREADS):
+    """Create an embedding model for the given backend ('torch', 'onnx' or 'onnx-int8')."""
+    if backend in ("onnx", "onnx-int8"):
+        return OnnxEmbeddings(quantize=backend == "onnx-int8", threads=threads)
+    if backend != "torch":
+        raise ValueError(f"Unknown embedding backend: {backend}")
+    if threads:
+        import torch
+        torch.set_num_threads(threads)
+    return HuggingFaceEmbeddings(
+        model_name=EMBEDDING_MODEL,
+        model_kwargs={'device': 'cpu'},
+        encode_kwargs={'normalize_embeddings': True, 'batch_size': EMBEDDING_BATCH_SIZE}
+    )
+
+
+class CachedQueryEmbeddings(Embeddings):
+    """
+    Wraps an embedding model with a small LRU of query text -> vector.
+
+    Repeated and suggested questions skip the encoder entirely. Document
+    embedding is passed straight through.
+    """
+
+    def __init__(self, base, max_entries=QUERY_CACHE_SIZE):
+        self.base = base
+        self.max_entries = max_entries
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0}
+
+    def embed_documents(self, texts):
+        return self.base.embed_documents(texts)
+
+    def embed_query(self, text):
+        key = " ".join(text.split())
+        with self._lock:
+            vector = self._cache.get(key)
+            if vector is not None:
+                self._cache.move_to_end(key)
+                self.stats["hits"] += 1
+                return list(vector)
+            self.stats["misses"] += 1
+        vector = self.base.embed_query(text)
+        with self._lock:
+            self._cache[key] = tuple(vector)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return vector
+
+
+@st.cache_resource(show_spinner=False)
+def get_embeddings():
+    """Load the configured embedding model once per process; shared by every vector store."""
+    try:
+        base = build_embeddings(EMBEDDING_BACKEND)
+    except Exception as e:
+        if EMBEDDING_BACKEND == "torch":
+            raise
+        st.warning(f"⚠️ {EMBEDDING_BACKEND} embedding backend unavailable ({e}); using PyTorch.")
+        base = build_embeddings("torch")
+    return CachedQueryEmbeddings(base)
+
+
+def model_bytes(embeddings):
+    """Weight memory of the embedding model."""
+    embeddings = getattr(embeddings, "base", embeddings)
+    if isinstance(embeddings, OnnxEmbeddings):
+        return os.path.getsize(embeddings.model_path)
+    try:
+        return sum(p.numel() * p.element_size() for p in embeddings._client.parameters())
+    except Exception:
+        return DEFAULT_MODEL_BYTES
+
+
+def embedding_dim(embeddings):
+    """Output dimension of the embedding model."""
+    embeddings = getattr(embeddings, "base", embeddings)
+    try:
+        return embeddings._client.get_sentence_embedding_dimension()
+    except Exception:
+        return DEFAULT_EMBEDDING_DIM
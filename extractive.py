@@ -0,0 +1,135 @@
+import re
+import hashlib
+import numpy as np
+from cache import shared_cache
+from embeddings import get_embeddings
+
+# Extractive summarization settings
+MIN_SENTENCE_CHARS = 30  # Shorter fragments (headers, page numbers) are ignored
+MAX_SENTENCES = 400  # Sentences scored per document; long texts are sampled evenly
+TEXTRANK_DAMPING = 0.85
+TEXTRANK_ITERATIONS = 50
+CENTROID_WEIGHT = 0.3  # Blend of centroid similarity into the TextRank score
+REDUNDANCY_THRESHOLD = 0.9  # Skip sentences this similar to one already picked
+
+_SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?])\s+(?=[A-Z0-9"\'(\[])')
+
+
+def split_sentences(text):
+    """Split text into sentences, dropping fragments too short to be useful."""
+    text = ' '.join(text.split())
+    return [s for s in _SENTENCE_BOUNDARY.split(text) if len(s) >= MIN_SENTENCE_CHARS]
+
+
+def score_sentences(vectors):
+    """
+    Rank sentences by TextRank centrality blended with centroid similarity.
+
+    Args:
+        vectors: (n, dim) array of L2-normalised sentence embeddings
+
+    Returns:
+        (n,) array of scores, higher is more important
+    """
+    n = len(vectors)
+    similarity = np.clip(vectors @ vectors.T, 0.0, None)
+    np.fill_diagonal(similarity, 0.0)
+    row_sums = similarity.sum(axis=1, keepdims=True)
+    transition = np.divide(similarity, row_sums, out=np.full_like(similarity, 1.0 / n), where=row_sums > 0)
+
+    rank = np.full(n, 1.0 / n)
+    for _ in range(TEXTRANK_ITERATIONS):
+        updated = (1 - TEXTRANK_DAMPING) / n + TEXTRANK_DAMPING * (transition.T @ rank)
+        if np.abs(updated - rank).sum() < 1e-6:
+            rank = updated
+            break
+        rank = updated
+
+    centroid = vectors.mean(axis=0)
+    centroid /= np.linalg.norm(centroid) or 1.0
+    centrality = vectors @ centroid
+
+    rank = rank / (rank.max() or 1.0)
+    return (1 - CENTROID_WEIGHT) * rank + CENTROID_WEIGHT * centrality
+
+
+def rank_sentences(text):
+    """
+    Split and score the sentences of `text`.
+
+    Runs locally on CPU with the already-loaded MiniLM model.
+
+    Returns:
+        (sentences, vectors, scores) - vectors and scores are None if the
+        text has no usable sentences
+    """
+    sentences = split_sentences(text)
+    if not sentences:
+        return sentences, None, None
+
+    if len(sentences) > MAX_SENTENCES:
+        keep = np.linspace(0, len(sentences) - 1, MAX_SENTENCES).astype(int)
+        sentences = [sentences[i] for i in keep]
+
+    vectors = np.asarray(get_embeddings().embed_documents(sentences), dtype=np.float32)
+    return sentences, vectors, score_sentences(vectors)
+
+
+def cached_rank_sentences(text):
+    """rank_sentences through the shared cache, keyed by text content."""
+    text_hash = hashlib.md5(text.encode("utf-8", errors="ignore")).hexdigest()
+    return shared_cache.get_or_compute(("sentence_ranking", text_hash), lambda: rank_sentences(text))
+
+
+def _select(text, ranking, max_sentences, max_chars):
+    """Best non-redundant sentences within the limits, in document order."""
+    sentences, vectors, scores = ranking
+    if not sentences:
+        return text[:max_chars] if max_chars else text
+
+    picked = []
+    used_chars = 0
+    for idx in np.argsort(-scores):
+        if max_sentences is not None and len(picked) >= max_sentences:
+            break
+        if picked and (vectors[picked] @ vectors[idx]).max() > REDUNDANCY_THRESHOLD:
+            continue
+        length = len(sentences[idx]) + 1
+        if max_chars is not None and used_chars + length > max_chars:
+            continue
+        picked.append(int(idx))
+        used_chars += length
+
+    return ' '.join(sentences[i] for i in sorted(picked))
+
+
+def extractive_summary(text, max_sentences=5, max_chars=None):
+    """
+    Pick the most important sentences, returned in document order.
+
+    Args:
+        text: Input text
+        max_sentences: Sentence limit (None for no limit)
+        max_chars: Character budget for the result (None for no limit)
+
+    Returns:
+        Summary string
+    """
+    return _select(text, rank_sentences(text), max_sentences, max_chars)
+
+
+def cached_extractive_summary(text, max_sentences=5, max_chars=None):
+    """
+    extractive_summary with the sentence ranking cached by text content.
+
+    The preview and input compression of the same text share one ranking,
+    so its sentences are embedded only once.
+    """
+    return _select(text, cached_rank_sentences(text), max_sentences, max_chars)
+
+
+def compress_text(text, max_chars):
+    """Shrink text to `max_chars` by keeping its most important sentences."""
+    if len(text) <= max_chars:
+        return text
+    return cached_extractive_summary(text, max_sentences=None, max_chars=max_chars)
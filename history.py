@@ -0,0 +1,90 @@
+import os
+import uuid
+from collections import deque
+from cache import shared_cache
+
+# Chat history limits (override via environment)
+CHAT_HISTORY_MAX_TURNS = int(os.getenv("CHAT_HISTORY_MAX_TURNS", "20"))  # Kept in session
+CHAT_ARCHIVE_PAGE = int(os.getenv("CHAT_ARCHIVE_PAGE", "10"))  # Turns per archived page
+
+
+class ChatHistory:
+    """
+    Capped chat history for one session.
+
+    Only the newest `max_turns` (question, answer) pairs live in session
+    state. Older turns are moved in pages of `page_size` to the shared
+    cache and read back only when the user asks for them.
+    """
+
+    def __init__(self, max_turns=CHAT_HISTORY_MAX_TURNS, page_size=CHAT_ARCHIVE_PAGE):
+        self.session_id = uuid.uuid4().hex
+        self.max_turns = max(max_turns, page_size)
+        self.page_size = page_size
+        self.recent = deque()
+        self.archived_pages = []  # Page numbers in the shared cache, oldest first
+        self._next_page = 0
+
+    def __len__(self):
+        return self.archived_turns + len(self.recent)
+
+    def __bool__(self):
+        return len(self) > 0
+
+    def __iter__(self):
+        """Every turn still available, oldest first (reads archived pages back from the cache)."""
+        for page in self._available_pages():
+            yield from self.load_archived(page)
+        yield from self.recent
+
+    @property
+    def archived_turns(self):
+        """Turns in archived pages that can still be loaded."""
+        return len(self._available_pages()) * self.page_size
+
+    def append(self, turn):
+        """Add a (question, answer) turn, archiving the oldest page once the session cap is hit."""
+        self.recent.append(tuple(turn))
+        if len(self.recent) > self.max_turns:
+            page = [self.recent.popleft() for _ in range(self.page_size)]
+            shared_cache.set(self._archive_key(self._next_page), page)
+            self.archived_pages.append(self._next_page)
+            self._next_page += 1
+
+    def tail(self, n):
+        """Newest `n` in-session turns, oldest first."""
+        if n <= 0:
+            return []
+        return list(self.recent)[-n:]
+
+    def window(self, n):
+        """Newest `n` turns, oldest first, reading only the archived pages needed."""
+        turns = self.tail(n)
+        pages = self._available_pages()
+        while len(turns) < n and pages:
+            turns = self.load_archived(pages.pop()) + turns
+        return turns[-n:] if n > 0 else []
+
+    def load_archived(self, page):
+        """Turns of an archived page (empty if it has expired from the cache)."""
+        return shared_cache.get(self._archive_key(page)) or []
+
+    def clear(self):
+        """Drop all turns, including archived pages."""
+        for page in self.archived_pages:
+            shared_cache.delete(self._archive_key(page))
+        self.recent.clear()
+        self.archived_pages = []
+
+    def _available_pages(self):
+        """
+        Archived pages still in the shared cache, oldest first.
+
+        Pages evicted (LRU, TTL, "Clear Cache") are forgotten, so counts
+        never include turns that can't be shown or exported.
+        """
+        self.archived_pages = [page for page in self.archived_pages if self._archive_key(page) in shared_cache]
+        return list(self.archived_pages)
+
+    def _archive_key(self, page):
+        return ("chat_archive", self.session_id, page)
@@ -0,0 +1,194 @@
+import os
+import heapq
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from diskcache import Index
+from langchain_core.documents import Document
+import chat_pdf
+from cache import CACHE_DIR, vectorstore_cache
+from embeddings import get_embeddings
+from scheduler import scheduler, PRIORITY_INTERACTIVE, is_rate_limit_error
+from uploads import get_spooled
+from utils import read_pdf_cached, count_tokens
+
+# Library settings (override via environment)
+LIBRARY_DIR = os.path.join(CACHE_DIR, "library")
+LIBRARY_SEARCH_WORKERS = int(os.getenv("LIBRARY_SEARCH_WORKERS", "8"))  # Shards queried in parallel
+LIBRARY_TOP_K = 5  # Chunks kept after the global merge
+LIBRARY_PER_SHARD_K = 3  # Candidates taken from each shard
+LIBRARY_TOKEN_BUDGET = 2000  # Approximate prompt tokens spent on context
+
+# Document metadata, shared by every process using the same CACHE_DIR.
+# Filters run against this catalog, so shards outside the filter are never opened.
+catalog = Index(LIBRARY_DIR)
+
+_search_pool = ThreadPoolExecutor(max_workers=LIBRARY_SEARCH_WORKERS, thread_name_prefix="library-search")
+
+
+def add_document(upload, tags=None):
+    """
+    Index a spooled PDF as its own shard and record it in the catalog.
+
+    Returns:
+        The document's metadata dict, or None if it could not be indexed
+    """
+    text = read_pdf_cached(upload, upload.file_hash)
+    if not text:
+        return None
+    # No summary tree: library answers come from retrieval, and hundreds of
+    # documents would spend the shared quota on section summaries
+    if chat_pdf.create_vectorstore(upload.file_hash, text, summary_tree=False) is None:
+        return None
+    existing = catalog.get(upload.file_hash, {})
+    metadata = {
+        "file_hash": upload.file_hash,
+        "name": upload.name,
+        "size": upload.size,
+        "characters": len(text),
+        "tags": sorted(set(existing.get("tags", [])) | set(tags or [])),
+        "added": existing.get("added", datetime.now().isoformat(timespec="seconds")),
+    }
+    catalog[upload.file_hash] = metadata
+    return metadata
+
+
+def remove_document(file_hash):
+    """Drop a document from the catalog (its shard stays on disk until the cache is cleared)."""
+    catalog.pop(file_hash, None)
+
+
+def list_documents(tags=None, name_contains=None, file_hashes=None):
+    """
+    Catalog entries matching every given filter.
+
+    Args:
+        tags: Keep documents carrying any of these tags
+        name_contains: Case-insensitive substring of the file name
+        file_hashes: Restrict to these documents
+    """
+    wanted_tags = set(tags or [])
+    wanted_hashes = set(file_hashes or [])
+    needle = (name_contains or "").lower()
+    documents = []
+    for metadata in catalog.values():
+        if wanted_tags and not wanted_tags & set(metadata["tags"]):
+            continue
+        if wanted_hashes and metadata["file_hash"] not in wanted_hashes:
+            continue
+        if needle and needle not in metadata["name"].lower():
+            continue
+        documents.append(metadata)
+    return sorted(documents, key=lambda m: m["name"].lower())
+
+
+def all_tags():
+    """Every tag used in the library."""
+    return sorted({tag for metadata in catalog.values() for tag in metadata["tags"]})
+
+
+@contextmanager
+def _open_shard(file_hash):
+    """
+    The document's vector store - live, reopened from disk, or rebuilt from
+    the spooled PDF - leased from the LRU until the block exits.
+    """
+    vectorstore = vectorstore_cache.acquire(file_hash)
+    if vectorstore is None:
+        def extract():  # Only needed if the persisted index is gone
+            upload = get_spooled(file_hash)
+            return read_pdf_cached(upload, file_hash) if upload else ""
+        vectorstore = chat_pdf.create_vectorstore(file_hash, extract, lease=True, summary_tree=False)
+    try:
+        yield vectorstore
+    finally:
+        if vectorstore is not None:
+            vectorstore_cache.release(vectorstore)
+
+
+def _search_shard(metadata, query_embedding, k):
+    """Top-k (distance, Document) pairs from one shard."""
+    with _open_shard(metadata["file_hash"]) as vectorstore:
+        if vectorstore is None:
+            return []
+        results = vectorstore._collection.query(
+            query_embeddings=[query_embedding],
+            n_results=k,
+            include=["documents", "metadatas", "distances"]
+        )
+    hits = []
+    for text, chunk_meta, distance in zip(results["documents"][0], results["metadatas"][0], results["distances"][0]):
+        doc_meta = dict(chunk_meta or {}, file_hash=metadata["file_hash"], source=metadata["name"])
+        hits.append((distance, Document(page_content=text, metadata=doc_meta)))
+    return hits
+
+
+def search_library(query, k=LIBRARY_TOP_K, per_shard_k=LIBRARY_PER_SHARD_K, **filters):
+    """
+    Search many documents at once.
+
+    The query is embedded once, every shard selected by `filters` (see
+    list_documents) is searched in parallel, and the per-shard hits are
+    merged into a global top-k by distance.
+
+    Returns:
+        List of Documents with `source` and `file_hash` metadata, best first
+    """
+    documents = list_documents(**filters)
+    if not documents:
+        return []
+    query_embedding = get_embeddings().embed_query(query)
+    shard_hits = _search_pool.map(lambda m: _search_shard(m, query_embedding, per_shard_k), documents)
+    merged = heapq.nsmallest(k, (hit for hits in shard_hits for hit in hits), key=lambda hit: hit[0])
+    return [doc for _, doc in merged]
+
+
+def chat_with_library(query, **filters):
+    """
+    Answer a question from the best passages across the library.
+
+    Returns:
+        (answer, source Documents)
+    """
+    try:
+        model = chat_pdf.model
+        if not model:
+            return "❌ Gemini API key not configured.", []
+
+        docs = search_library(query, **filters)
+        if not docs:
+            return "❌ No relevant information found in the library.", []
+
+        # Keep the best passages that fit the budget, labelled with their source
+        context_parts = []
+        used_tokens = 0
+        kept = []
+        for doc in docs:
+            tokens = count_tokens(doc.page_content)
+            if kept and used_tokens + tokens > LIBRARY_TOKEN_BUDGET:
+                break
+            context_parts.append(f"[{doc.metadata['source']}]\n{doc.page_content}")
+            kept.append(doc)
+            used_tokens += tokens
+        context = "\n\n".join(context_parts)
+
+        prompt = f"""Answer the question based on the excerpts below, which come from several documents. Name the document(s) you used in square brackets. If the answer is not in the excerpts, say "Not found in library."
+
+Excerpts:
+{context}
+
+Question: {query}
+
+Answer:"""
+
+        response = scheduler.generate(model, prompt, priority=PRIORITY_INTERACTIVE)
+        answer = response.text.strip() if response.text else "No response generated."
+        return answer, kept
+
+    except Exception as e:
+        error_msg = str(e)
+        if "timeout" in error_msg.lower():
+            return "⏱️ Request timed out. Please try again.", []
+        elif is_rate_limit_error(e):
+            return "🚫 Rate limit reached. Wait a moment.", []
+        return f"❌ Error: {error_msg}", []
@@ -0,0 +1,248 @@
+"""
+Concurrent-session load test for the summarize and chat flows.
+
+Each simulated session runs the same steps a user triggers in app.py
+(extract -> summarize -> index -> N chat questions) against a local fake
+Gemini with configurable latency. Sessions run as threads, like Streamlit
+sessions do. Each session count runs in a fresh process with its own
+cache directory, so peak RSS and cache behaviour are measured independently.
+
+Usage:
+    python load_test.py --sessions 1,4,8,16 --questions 3 --latency 1.5
+    python load_test.py --pdf handbook.pdf --distinct-docs
+"""
+import os
+import io
+import sys
+import json
+import time
+import hashlib
+import random
+import logging
+import argparse
+import resource
+import tempfile
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+STAGES = ["extract", "summarize", "index", "chat"]
+QUESTIONS = [
+    "What is the main topic of this document?",
+    "What are the key points in this document?",
+    "What are the main findings or conclusions?",
+    "Who are the main people or entities mentioned?",
+]
+SAMPLE_SENTENCES = [
+    "The committee reviewed the quarterly results and approved the new budget.",
+    "Employees may request remote work after completing the probation period.",
+    "Safety inspections are carried out every month by the facilities team.",
+    "Revenue in the northern region grew faster than in any other market.",
+    "The study found that regular breaks improved concentration and accuracy.",
+    "Customer complaints fell sharply after the support process was redesigned.",
+]
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeGeminiModel:
+    """Stands in for genai.GenerativeModel with a fixed latency plus jitter."""
+
+    model_name = "fake-gemini"
+
+    def __init__(self, latency, jitter):
+        self.latency = latency
+        self.jitter = jitter
+
+    def generate_content(self, prompt):
+        time.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+        return FakeResponse(f"Stub answer for a {len(prompt):,}-character prompt.")
+
+
+def make_synthetic_pdf(pages=20, lines_per_page=40, seed=0):
+    """Build a plain-text PDF without extra dependencies."""
+    rng = random.Random(seed)
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None,
+               "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_ids = []
+    for page in range(pages):
+        lines = [f"Section {page + 1}.{line + 1}: {rng.choice(SAMPLE_SENTENCES)}" for line in range(lines_per_page)]
+        body = "BT /F1 9 Tf 40 800 Td 11 TL " + " ".join(
+            "(" + text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)") + ") '" for text in lines
+        ) + " ET"
+        objects.append(f"<< /Length {len(body)} >>\nstream\n{body}\nendstream")
+        content_id = len(objects)
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+                       f"/Resources << /Font << /F1 3 0 R >> >> /Contents {content_id} 0 R >>")
+        page_ids.append(len(objects))
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(f'{i} 0 R' for i in page_ids)}] /Count {pages} >>"
+
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, obj in enumerate(objects, 1):
+        offsets.append(out.tell())
+        out.write(f"{number} 0 obj\n{obj}\nendobj\n".encode("latin-1"))
+    xref = out.tell()
+    out.write(f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1"))
+    for offset in offsets:
+        out.write(f"{offset:010d} 00000 n \n".encode("latin-1"))
+    out.write(f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("latin-1"))
+    return out.getvalue()
+
+
+def percentiles(samples):
+    if not samples:
+        return {"p50": None, "p95": None, "p99": None}
+    values = np.percentile(np.asarray(samples) * 1000, [50, 95, 99])
+    return {"p50": float(values[0]), "p95": float(values[1]), "p99": float(values[2])}
+
+
+def run_sessions(args):
+    """Run `args.run_one` concurrent sessions in this process and return the metrics."""
+    logging.getLogger("streamlit").setLevel(logging.ERROR)  # No ScriptRunContext outside `streamlit run`
+
+    import summarizer
+    import chat_pdf
+    from scheduler import scheduler, TokenBucket
+    from uploads import spool_upload
+    from utils import read_pdf_cached
+
+    fake = FakeGeminiModel(args.latency, args.jitter)
+    summarizer.model = fake
+    chat_pdf.model = fake
+    scheduler.requests = TokenBucket(args.rpm)
+    scheduler.tokens = TokenBucket(args.tpm)
+
+    pdf_bytes = open(args.pdf, "rb").read() if args.pdf else make_synthetic_pdf(args.pages)
+    timings = {stage: [] for stage in STAGES}
+    errors = []
+
+    # Spool every session's document up front and check its hash, so each
+    # session is guaranteed to work on its own (or the shared) document
+    uploads = []
+    for session_id in range(args.run_one):
+        data = pdf_bytes
+        if args.distinct_docs:
+            data += f"\n% session {session_id}\n".encode("latin-1")  # Unique hash, same content
+        upload = spool_upload(io.BytesIO(data))
+        if upload.file_hash != hashlib.md5(data).hexdigest():
+            raise RuntimeError(f"Session {session_id} was spooled as another document")
+        uploads.append(upload)
+
+    def timed(stage, fn, *fn_args, **fn_kwargs):
+        start = time.perf_counter()
+        result = fn(*fn_args, **fn_kwargs)
+        timings[stage].append(time.perf_counter() - start)
+        return result
+
+    def session(session_id):
+        try:
+            upload = uploads[session_id]
+            text = timed("extract", read_pdf_cached, upload, upload.file_hash)
+            timed("summarize", summarizer.summarize_pdf_cached, upload.file_hash, text, "concise")
+            timed("index", chat_pdf.create_vectorstore, upload.file_hash, text)
+            for turn in range(args.questions):
+                question = QUESTIONS[turn % len(QUESTIONS)]
+                if args.unique_prompts:
+                    question += f" (session {session_id})"
+                answer, _ = timed("chat", chat_pdf.chat_with_pdf, upload, question, upload.file_hash)
+                if answer.startswith(("❌", "⏱️", "🚫")):
+                    errors.append(answer)
+        except Exception as e:
+            errors.append(str(e))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.run_one) as pool:
+        list(pool.map(session, range(args.run_one)))
+    wall = time.perf_counter() - start
+
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KB on Linux
+    return {
+        "sessions": args.run_one,
+        "wall_s": wall,
+        "sessions_per_min": 60 * args.run_one / wall,
+        "questions_per_s": len(timings["chat"]) / wall,
+        "peak_rss_mb": peak_rss_mb,
+        "documents": len({upload.file_hash for upload in uploads}),
+        "errors": len(errors),
+        "first_error": errors[0] if errors else None,
+        "stages": {stage: percentiles(samples) for stage, samples in timings.items()},
+    }
+
+
+def print_report(results):
+    # Memory per session is the growth over the 1-session run, which already
+    # holds the shared embedding model, libraries and interpreter
+    baseline = next((r for r in results if r["sessions"] == 1), None)
+    print(f"\n{'sessions':>8} {'docs':>5} {'wall s':>8} {'sess/min':>9} {'q/s':>7} {'peak RSS MB':>12} "
+          f"{'+RSS MB':>8} {'MB/extra sess':>14} {'errors':>7}")
+    for r in results:
+        growth = f"{r['peak_rss_mb'] - baseline['peak_rss_mb']:.0f}" if baseline else "-"
+        per_session = "-"
+        if baseline and r["sessions"] > 1:
+            per_session = f"{(r['peak_rss_mb'] - baseline['peak_rss_mb']) / (r['sessions'] - 1):.1f}"
+        print(f"{r['sessions']:>8} {r['documents']:>5} {r['wall_s']:>8.1f} {r['sessions_per_min']:>9.1f} "
+              f"{r['questions_per_s']:>7.2f} {r['peak_rss_mb']:>12.0f} {growth:>8} {per_session:>14} {r['errors']:>7}")
+
+    print(f"\n{'sessions':>8} {'stage':>10} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for r in results:
+        for stage in STAGES:
+            p = r["stages"][stage]
+            if p["p50"] is None:
+                continue
+            print(f"{r['sessions']:>8} {stage:>10} {p['p50']:>9.0f} {p['p95']:>9.0f} {p['p99']:>9.0f}")
+
+    for r in results:
+        if r["first_error"]:
+            print(f"\n{r['sessions']} sessions - first error: {r['first_error']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", default="1,4,8", help="Comma-separated concurrent session counts")
+    parser.add_argument("--questions", type=int, default=3, help="Chat questions per session")
+    parser.add_argument("--latency", type=float, default=1.0, help="Fake Gemini latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.2, help="Uniform +/- jitter on the latency")
+    parser.add_argument("--rpm", type=int, default=100000, help="Scheduler requests/min (default: effectively unlimited)")
+    parser.add_argument("--tpm", type=int, default=100000000, help="Scheduler tokens/min")
+    parser.add_argument("--pdf", help="PDF to use (default: synthetic document)")
+    parser.add_argument("--pages", type=int, default=20, help="Pages in the synthetic document")
+    parser.add_argument("--distinct-docs", action="store_true", help="Give every session its own document hash")
+    parser.add_argument("--shared-prompts", dest="unique_prompts", action="store_false",
+                        help="Let sessions ask identical questions (exercises request coalescing)")
+    parser.add_argument("--json", help="Also write raw results to this file")
+    parser.add_argument("--run-one", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_one:
+        print(json.dumps(run_sessions(args)))
+        return
+
+    counts = sorted({int(n) for n in args.sessions.split(",") if n.strip()} | {1})  # 1 = memory baseline
+    results = []
+    for count in counts:
+        print(f"Running {count} concurrent session(s)...", flush=True)
+        child_args = [a for a in sys.argv[1:]] + ["--run-one", str(count)]
+        with tempfile.TemporaryDirectory(prefix="loadtest_cache_") as cache_dir:
+            env = dict(os.environ, CACHE_DIR=cache_dir)
+            proc = subprocess.run(
+                [sys.executable, os.path.abspath(__file__)] + child_args,
+                env=env, capture_output=True, text=True
+            )
+        if proc.returncode != 0:
+            print(proc.stderr[-2000:])
+            continue
+        results.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+
+    print_report(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+import os
+import time
+import heapq
+import hashlib
+import logging
+import itertools
+import threading
+from contextlib import nullcontext
+from concurrent.futures import Future
+from diskcache import Cache
+from dotenv import load_dotenv
+from cache import CACHE_DIR
+from utils import count_tokens
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Quota for the Gemini project (override via environment)
+GEMINI_RPM = int(os.getenv("GEMINI_RPM", "10"))  # Requests per minute
+GEMINI_TPM = int(os.getenv("GEMINI_TPM", "250000"))  # Tokens per minute
+SCHEDULER_WORKERS = int(os.getenv("SCHEDULER_WORKERS", "4"))  # Concurrent upstream calls
+# Keep the quota in CACHE_DIR so every process using it (API workers, replicas on a
+# shared volume) draws from one budget. Set to 0 for a per-process quota.
+GEMINI_SHARED_QUOTA = os.getenv("GEMINI_SHARED_QUOTA", "1") != "0"
+QUOTA_DIR = os.path.join(CACHE_DIR, "quota")
+RATE_LIMIT_RETRIES = 2
+EXPECTED_OUTPUT_TOKENS = 500  # Budgeted per call on top of the prompt
+WORKER_ERROR_BACKOFF = 1.0  # Seconds a worker pauses after an unexpected error
+
+# Priority classes - lower runs first
+PRIORITY_INTERACTIVE = 0  # Chat questions
+PRIORITY_STANDARD = 1  # On-demand summaries
+PRIORITY_BATCH = 2  # Background pre-computation
+
+
+def is_rate_limit_error(error):
+    """True for upstream quota / 429 errors."""
+    message = str(error).lower()
+    return any(marker in message for marker in ("rate limit", "429", "quota", "resource has been exhausted"))
+
+
+class TokenBucket:
+    """Refills `per_minute` units evenly over a minute, up to one minute of burst."""
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount):
+        """Seconds until `amount` units are available (0 if they are now)."""
+        self._refill()
+        amount = min(amount, self.capacity)  # Oversized requests wait for a full bucket
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount):
+        self._refill()
+        self.tokens -= min(amount, self.capacity)
+
+    def drain(self):
+        """Empty the bucket (upstream says we're over quota)."""
+        self._refill()
+        self.tokens = 0.0
+
+    def transact(self):
+        """Context in which a wait_time/consume sequence is atomic (the caller's lock suffices here)."""
+        return nullcontext()
+
+
+class SharedTokenBucket(TokenBucket):
+    """
+    TokenBucket whose level lives in a disk cache.
+
+    Every process opening the same `store` draws from one bucket. Wrap
+    check-then-consume sequences in `transact()` so they are atomic
+    across processes.
+    """
+
+    def __init__(self, per_minute, store, key):
+        super().__init__(per_minute)
+        self.store = store
+        self.key = key
+
+    def _refill(self):
+        now = time.time()  # Wall clock - comparable between processes
+        tokens, updated = self.store.get(self.key, default=(self.capacity, now))
+        self.tokens = min(self.capacity, tokens + max(0.0, now - updated) * self.rate)
+        self.updated = now
+
+    def consume(self, amount):
+        with self.transact():
+            super().consume(amount)
+            self.store.set(self.key, (self.tokens, self.updated))
+
+    def drain(self):
+        with self.transact():
+            super().drain()
+            self.store.set(self.key, (self.tokens, self.updated))
+
+    def transact(self):
+        return self.store.transact()
+
+
+class _Job:
+    def __init__(self, key, model, prompt, priority):
+        self.key = key
+        self.model = model
+        self.prompt = prompt
+        self.priority = priority
+        self.cost = count_tokens(prompt) + EXPECTED_OUTPUT_TOKENS
+        self.future = Future()
+        self.started = False
+        self.attempts = 0
+
+
+class RequestScheduler:
+    """
+    Shared front door to the LLM for every session in the process.
+
+    Calls are admitted through request and token buckets sized to the
+    quota, higher-priority work is admitted first, and identical prompts
+    that are already queued or running share one upstream call. With
+    `shared`, the buckets live in QUOTA_DIR and are shared by every
+    process using the same CACHE_DIR.
+    """
+
+    def __init__(self, rpm=GEMINI_RPM, tpm=GEMINI_TPM, workers=SCHEDULER_WORKERS, shared=GEMINI_SHARED_QUOTA):
+        if shared:
+            store = Cache(QUOTA_DIR)
+            self.requests = SharedTokenBucket(rpm, store, "requests")
+            self.tokens = SharedTokenBucket(tpm, store, "tokens")
+        else:
+            self.requests = TokenBucket(rpm)
+            self.tokens = TokenBucket(tpm)
+        self._queue = []  # (priority, seq, job)
+        self._inflight = {}  # prompt key -> job
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self.stats = {"submitted": 0, "coalesced": 0, "upstream": 0, "retries": 0}
+        for idx in range(workers):
+            threading.Thread(target=self._worker, name=f"llm-scheduler-{idx}", daemon=True).start()
+
+    def generate(self, model, prompt, priority=PRIORITY_INTERACTIVE, timeout=None):
+        """
+        Run `model.generate_content(prompt)` under the shared rate limit.
+
+        Returns:
+            The model response (shared with any coalesced callers)
+        """
+        key = hashlib.sha256(f"{getattr(model, 'model_name', '')}\0{prompt}".encode("utf-8")).hexdigest()
+        with self._cond:
+            self.stats["submitted"] += 1
+            job = self._inflight.get(key)
+            if job is not None:
+                self.stats["coalesced"] += 1
+                if priority < job.priority and not job.started:
+                    # A more urgent caller joined - requeue at the better priority
+                    job.priority = priority
+                    self._push(job)
+            else:
+                job = _Job(key, model, prompt, priority)
+                self._inflight[key] = job
+                self._push(job)
+        return job.future.result(timeout=timeout)
+
+    def snapshot(self):
+        """Counters and queue depth for display."""
+        with self._cond:
+            stats = dict(self.stats)
+            # Priority bumps leave stale heap entries behind - count each job once
+            stats["queued"] = len({id(job) for _, _, job in self._queue if not job.started})
+            stats["inflight"] = len(self._inflight)
+        return stats
+
+    def _push(self, job):
+        heapq.heappush(self._queue, (job.priority, next(self._seq), job))
+        self._cond.notify()
+
+    def _next_job(self):
+        """Block until the most urgent queued job fits in both buckets."""
+        with self._cond:
+            while True:
+                # Skip stale heap entries left behind by priority bumps
+                while self._queue and (self._queue[0][2].started or self._queue[0][0] != self._queue[0][2].priority):
+                    heapq.heappop(self._queue)
+                if not self._queue:
+                    self._cond.wait()
+                    continue
+                job = self._queue[0][2]
+                with self.requests.transact():  # Both buckets share one store
+                    wait = max(self.requests.wait_time(1), self.tokens.wait_time(job.cost))
+                    if wait <= 0:
+                        self.requests.consume(1)
+                        self.tokens.consume(job.cost)
+                if wait > 0:
+                    self._cond.wait(wait)
+                    continue
+                heapq.heappop(self._queue)
+                job.started = True
+                self.stats["upstream"] += 1
+                return job
+
+    def _worker(self):
+        while True:
+            job = None
+            try:
+                job = self._next_job()
+                self._run(job)
+            except Exception as e:
+                # e.g. a diskcache Timeout on the shared quota under contention -
+                # keep the worker alive, and never leave a caller waiting forever
+                logger.exception("LLM scheduler worker error")
+                if job is not None and not job.future.done():
+                    self._finish(job)
+                    job.future.set_exception(e)
+                time.sleep(WORKER_ERROR_BACKOFF)
+
+    def _run(self, job):
+        try:
+            result = job.model.generate_content(job.prompt)
+        except Exception as e:
+            if is_rate_limit_error(e) and job.attempts < RATE_LIMIT_RETRIES:
+                with self._cond:
+                    job.attempts += 1
+                    job.started = False
+                    self.stats["retries"] += 1
+                    self.requests.drain()
+                    self._push(job)
+                return
+            self._finish(job)
+            job.future.set_exception(e)
+        else:
+            self._finish(job)
+            job.future.set_result(result)
+
+    def _finish(self, job):
+        with self._cond:
+            if self._inflight.get(job.key) is job:
+                del self._inflight[job.key]
+
+
+# Shared by every session in this process (and its quota by every process on CACHE_DIR)
+scheduler = RequestScheduler()
@@ -0,0 +1,178 @@
+import os
+import re
+import json
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from langchain_core.documents import Document
+from cache import shared_cache, process_lock, VECTORSTORE_DIR
+from extractive import extractive_summary
+from scheduler import scheduler, PRIORITY_BATCH
+from utils import count_tokens
+
+logger = logging.getLogger(__name__)
+
+# Summary tree settings: chunk -> section -> document
+CHUNK_SUMMARY_SENTENCES = 3  # Local extractive summary per chunk (no LLM call)
+SECTION_SIZE = 5  # Consecutive chunks per section
+SECTION_FALLBACK_CHARS = 1500  # Extractive text kept when a section LLM call fails
+OVERVIEW_TOKEN_BUDGET = 2000  # Section summaries sent alongside the document summary
+SUMMARY_TREE_WORKERS = 2
+SUMMARY_TREE_RETRY_AFTER = int(os.getenv("SUMMARY_TREE_RETRY_AFTER", "900"))  # Seconds to wait after a failed build
+
+SECTION_PROMPT = """Summarize the following excerpts from one section of a document in 3-5 sentences. Keep names, numbers and conclusions.
+
+Excerpts:
+{text}
+
+Section summary:"""
+
+DOCUMENT_PROMPT = """Below are summaries of each section of a document, in order. Write an overview of the whole document covering its main topic, key points, main findings or conclusions, and the main people or entities involved.
+
+Section summaries:
+{text}
+
+Document overview:"""
+
+# Questions about the document as a whole rather than a specific detail.
+# A question is broad when it has one of these cues and nothing else but
+# filler words - "summary table on page 12" or "conclusion of the 2019
+# audit" name a specific subject and go to retrieval instead.
+_ASPECT = r"(points?|ideas?|topics?|themes?|findings?|conclusions?|takeaways?|entities|people)"
+_BROAD_CUE = re.compile(
+    r"\b(summar(y|ize|ise)|overview|gist|tl;?dr|about|"
+    rf"(main|key) {_ASPECT}(,? (or|and) ((main|key) )?{_ASPECT})*)\b",
+    re.IGNORECASE
+)
+_FILLER = re.compile(
+    r"\b(can|could|would|you|please|give|provide|write|tell|me|us|a|an|the|of|in|on|for|from|"
+    r"this|that|it|whole|entire|document|doc|pdf|paper|report|file|text|"
+    r"what|who|are|is|was|were|does|do|and|or|brief|briefly|short|quick|"
+    r"mentioned|discussed|covered|described)\b",
+    re.IGNORECASE
+)
+
+_executor = ThreadPoolExecutor(max_workers=SUMMARY_TREE_WORKERS, thread_name_prefix="summary-tree")
+_building = set()
+_building_lock = threading.Lock()
+
+
+def is_broad_question(query):
+    """True for document-level questions best answered from the summary tree."""
+    if not _BROAD_CUE.search(query):
+        return False
+    rest = _FILLER.sub(" ", _BROAD_CUE.sub(" ", query))
+    return not re.sub(r"[\W_]+", "", rest)
+
+
+def _tree_path(file_hash):
+    return os.path.join(VECTORSTORE_DIR, file_hash, "summary_tree.json")
+
+
+def load_summary_tree(file_hash):
+    """The precomputed summary tree for a document, or None if it isn't built yet."""
+    def read():
+        path = _tree_path(file_hash)
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    return shared_cache.get_or_compute(("summary_tree", file_hash), read)
+
+
+def _llm_summary(model, prompt_template, text, fallback):
+    """LLM summary of `text`, or (`fallback`, False) if the call failed."""
+    try:
+        response = scheduler.generate(model, prompt_template.format(text=text), priority=PRIORITY_BATCH)
+        result = response.text.strip() if response.text else ""
+        return (result, True) if result else (fallback, False)
+    except Exception as e:
+        logger.warning("Summary tree LLM call failed: %s", e)
+        return fallback, False
+
+
+def build_summary_tree(file_hash, chunks, model):
+    """
+    Summarize a document bottom-up and store the tree next to its vector index.
+
+    Chunk summaries are extractive (local); section and document summaries
+    are LLM calls at batch priority, so they never delay interactive chat.
+    If any LLM call fails (e.g. quota), the tree is returned but not stored,
+    and `ensure_summary_tree` waits SUMMARY_TREE_RETRY_AFTER seconds before
+    building it again.
+    """
+    chunk_summaries = [extractive_summary(chunk, max_sentences=CHUNK_SUMMARY_SENTENCES) for chunk in chunks]
+
+    complete = True
+    sections = []
+    for start in range(0, len(chunks), SECTION_SIZE):
+        members = list(range(start, min(start + SECTION_SIZE, len(chunks))))
+        text = "\n\n".join(chunk_summaries[i] for i in members)
+        summary, ok = _llm_summary(model, SECTION_PROMPT, text, text[:SECTION_FALLBACK_CHARS])
+        complete = complete and ok
+        sections.append({"chunks": members, "summary": summary})
+
+    section_text = "\n\n".join(
+        f"Section {idx}: {section['summary']}" for idx, section in enumerate(sections, 1)
+    )
+    document, ok = _llm_summary(model, DOCUMENT_PROMPT, section_text, section_text[:SECTION_FALLBACK_CHARS])
+
+    tree = {"document": document, "sections": sections, "chunks": chunk_summaries}
+    if not (complete and ok):
+        # Fallback text only - don't persist it, and back off before retrying
+        shared_cache.set(("summary_tree_failed", file_hash), time.time(), ttl=SUMMARY_TREE_RETRY_AFTER)
+        return tree
+    path = _tree_path(file_hash)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.part"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(tree, f)
+    os.replace(tmp_path, path)
+    shared_cache.set(("summary_tree", file_hash), tree)
+    return tree
+
+
+def ensure_summary_tree(file_hash, chunks, model):
+    """Start building the summary tree in the background unless it exists or is underway (in any process)."""
+    if not model or not chunks or os.path.exists(_tree_path(file_hash)):
+        return
+    if shared_cache.get(("summary_tree_failed", file_hash)) is not None:
+        return  # Failed recently (e.g. quota) - retried once the record expires
+    with _building_lock:
+        if file_hash in _building:
+            return
+        _building.add(file_hash)
+
+    def build():
+        try:
+            # One build per document across every process sharing CACHE_DIR
+            with process_lock(("summary_tree", file_hash)):
+                # Another process may have finished it, or failed, meanwhile
+                done = os.path.exists(_tree_path(file_hash))
+                if not done and shared_cache.get(("summary_tree_failed", file_hash)) is None:
+                    build_summary_tree(file_hash, chunks, model)
+        except Exception:
+            logger.exception("Summary tree build failed for %s", file_hash)
+            shared_cache.set(("summary_tree_failed", file_hash), time.time(), ttl=SUMMARY_TREE_RETRY_AFTER)
+        finally:
+            with _building_lock:
+                _building.discard(file_hash)
+
+    _executor.submit(build)
+
+
+def overview_documents(tree, token_budget=OVERVIEW_TOKEN_BUDGET):
+    """Document summary plus as many section summaries as fit the budget, as Documents."""
+    docs = [Document(page_content=tree["document"], metadata={"level": "document"})]
+    used_tokens = count_tokens(tree["document"])
+    for idx, section in enumerate(tree["sections"]):
+        tokens = count_tokens(section["summary"])
+        if used_tokens + tokens > token_budget:
+            break
+        docs.append(Document(
+            page_content=section["summary"],
+            metadata={"level": "section", "section": idx, "chunks": ",".join(map(str, section["chunks"]))}
+        ))
+        used_tokens += tokens
+    return docs
@@ -3,13 +3,19 @@
 
 import os
 import hashlib
+import logging
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 import google.generativeai as genai
 from dotenv import load_dotenv
 import streamlit as st
+from cache import shared_cache
+from scheduler import scheduler, PRIORITY_STANDARD, is_rate_limit_error
+from extractive import compress_text
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 API_KEY = os.getenv("GEMINI_API_KEY")
 
 # Initialize Gemini directly (not through LangChain)
@@ -30,9 +36,14 @@ text_splitter = RecursiveCharacterTextSplitter(
 
 # Disable cache temporarily to debug
 # @st.cache_data(show_spinner=False, ttl=3600)
-def summarize_text(text, summary_type="concise"):
+def summarize_text(text, summary_type="concise", priority=PRIORITY_STANDARD, compress=True):
     """
     Summarization using Gemini 2.5 Flash.
+    
+    Calls go through the shared request scheduler; pass PRIORITY_BATCH for
+    background work so interactive requests are served first. With
+    `compress`, long inputs are condensed locally to their most important
+    sentences instead of being cut off at the first 5k characters.
     """
     if not model:
         return "❌ Error: Gemini API key not configured."
@@ -54,14 +65,24 @@ def summarize_text(text, summary_type="concise"):
         max_input_length = 5000  # Process max 5k chars for speed
         
         if len(text) > max_input_length:
-            st.warning(f"⚡ Text truncated to {max_input_length} chars for speed.")
-            text = text[:max_input_length]
+            condensed = None
+            if compress:
+                try:
+                    condensed = compress_text(text, max_input_length)
+                except Exception as e:
+                    logger.warning("Local compression failed: %s", e)
+            if condensed:
+                st.info(f"⚡ Text condensed to its key sentences ({len(condensed):,} chars) for speed.")
+                text = condensed
+            else:
+                st.warning(f"⚡ Text truncated to {max_input_length} chars for speed.")
+                text = text[:max_input_length]
         
-        # Direct Gemini API call
+        # Gemini call via the shared, rate-limited scheduler
         prompt = template.format(text=text)
         print(f"DEBUG: Sending prompt of length {len(prompt)}")
         
-        response = model.generate_content(prompt)
+        response = scheduler.generate(model, prompt, priority=priority)
         print(f"DEBUG: Response: {response}")
         print(f"DEBUG: Response text: {repr(response.text)}")
         
@@ -76,15 +97,24 @@ def summarize_text(text, summary_type="concise"):
         error_msg = str(e)
         if "timeout" in error_msg.lower():
             return "⏱️ Timeout. Try shorter text."
-        elif "rate limit" in error_msg.lower():
+        elif is_rate_limit_error(e):
             return "🚫 Rate limit. Wait and retry."
         return f"❌ Error: {error_msg}"
 
 
-# Disable cache temporarily
-# @st.cache_data(show_spinner=False, ttl=3600)
-def summarize_pdf_cached(pdf_hash, text, summary_type):
-    """Cached PDF summarization."""
-    return summarize_text(text, summary_type)
+def is_error_result(result):
+    """True for the user-facing error strings returned by summarize_text."""
+    return not result or result.startswith(("❌", "⏱️", "🚫"))
+
+
+def summarize_pdf_cached(pdf_hash, text, summary_type, compress=True):
+    """Cached PDF summarization, shared across sessions via the tiered cache."""
+    key = ("summary", pdf_hash, summary_type, compress)
+    summary = shared_cache.get(key)
+    if summary is None:
+        summary = summarize_text(text, summary_type, compress=compress)
+        if not is_error_result(summary):
+            shared_cache.set(key, summary)
+    return summary
 
 
@@ -0,0 +1,7 @@
+import os
+import sys
+import tempfile
+
+# Keep caches, spooled uploads and indexes out of the working tree
+os.environ.setdefault("CACHE_DIR", tempfile.mkdtemp(prefix="pdf-assistant-tests-"))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,36 @@
+from cache import ResourceCache
+
+
+def test_eviction_of_leased_entry_is_deferred_until_release():
+    released = []
+    cache = ResourceCache(max_mb=1)
+    one_mb = 1024 * 1024
+    first = object()
+    cache.put("a", first, one_mb, on_evict=released.append, lease=True)
+    cache.put("b", object(), one_mb, on_evict=released.append)  # Evicts "a" while leased
+
+    assert cache.get("a") is None
+    assert released == []
+    cache.release(first)
+    assert released == [first]
+
+
+def test_unleased_entry_is_released_on_eviction():
+    released = []
+    cache = ResourceCache(max_mb=1)
+    first = object()
+    cache.put("a", first, 1024 * 1024, on_evict=released.append)
+    assert cache.acquire("a") is first
+    cache.release(first)
+    cache.put("b", object(), 1024 * 1024, on_evict=released.append)
+    assert released == [first]
+
+
+def test_entry_count_is_capped():
+    released = []
+    cache = ResourceCache(max_mb=1024, max_entries=2)
+    values = [object() for _ in range(3)]
+    for idx, value in enumerate(values):
+        cache.put(idx, value, 1, on_evict=released.append)
+    assert released == [values[0]]
+    assert cache.snapshot()["entries"] == 2
@@ -0,0 +1,19 @@
+from chat_pdf import _strip_overlap
+
+
+def test_strip_overlap_removes_splitter_overlap():
+    previous = "The first chunk ends with the overlapping sentence that is repeated."
+    text = "the overlapping sentence that is repeated. Then new text follows."
+    assert _strip_overlap(previous, text) == "Then new text follows."
+
+
+def test_strip_overlap_ignores_short_coincidental_match():
+    previous = "Chunks split at a paragraph break share nothing, like data"
+    text = "a new paragraph begins here."
+    assert _strip_overlap(previous, text) == text
+
+
+def test_strip_overlap_requires_word_boundary():
+    previous = "x" * 10 + " repeated words in the tail of the chunk"
+    text = "words in the tail of the chunkier section starts here."
+    assert _strip_overlap(previous, text) == text
@@ -0,0 +1,31 @@
+import numpy as np
+import extractive
+from cache import shared_cache
+
+TEXT = " ".join(
+    f"Sentence number {i} talks about topic {i % 7} in some detail here." for i in range(60)
+)
+
+
+class CountingEmbeddings:
+    def __init__(self):
+        self.calls = 0
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        rng = np.random.default_rng(0)
+        vectors = rng.normal(size=(len(texts), 16))
+        return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).tolist()
+
+
+def test_preview_and_compression_share_one_ranking(monkeypatch):
+    shared_cache.clear()
+    embeddings = CountingEmbeddings()
+    monkeypatch.setattr(extractive, "get_embeddings", lambda: embeddings)
+
+    preview = extractive.cached_extractive_summary(TEXT, max_sentences=5)
+    condensed = extractive.compress_text(TEXT, max_chars=1000)
+
+    assert embeddings.calls == 1
+    assert len(extractive.split_sentences(preview)) == 5
+    assert 0 < len(condensed) <= 1000
@@ -0,0 +1,46 @@
+from cache import shared_cache
+from history import ChatHistory
+
+
+def turns(start, stop):
+    return [(f"q{i}", f"a{i}") for i in range(start, stop)]
+
+
+def filled(count, max_turns=4, page_size=2):
+    history = ChatHistory(max_turns=max_turns, page_size=page_size)
+    for turn in turns(0, count):
+        history.append(turn)
+    return history
+
+
+def test_append_archives_oldest_page_on_overflow():
+    history = filled(5)
+    assert list(history.recent) == turns(2, 5)
+    assert history.archived_pages == [0]
+    assert history.load_archived(0) == turns(0, 2)
+    assert len(history) == 5
+    assert list(history) == turns(0, 5)
+
+
+def test_window_reads_back_across_pages():
+    history = filled(9)  # Pages [0-1], [2-3] archived, 4 recent
+    assert history.window(2) == turns(7, 9)
+    assert history.window(6) == turns(3, 9)
+    assert history.window(20) == turns(0, 9)
+    assert history.window(0) == []
+
+
+def test_clear_drops_archived_pages():
+    history = filled(9)
+    keys = [history._archive_key(page) for page in history.archived_pages]
+    history.clear()
+    assert len(history) == 0 and not history
+    assert all(key not in shared_cache for key in keys)
+
+
+def test_evicted_pages_are_not_counted():
+    history = filled(9)
+    shared_cache.delete(history._archive_key(0))  # e.g. LRU, TTL or "Clear Cache"
+    assert len(history) == 7
+    assert list(history) == turns(2, 9)
+    assert history.window(20) == turns(2, 9)
@@ -0,0 +1,57 @@
+from diskcache import Cache
+from scheduler import SharedTokenBucket
+
+
+def test_shared_buckets_draw_from_one_quota(tmp_path):
+    # Two processes = two bucket objects over the same store
+    first = SharedTokenBucket(10, Cache(str(tmp_path)), "requests")
+    second = SharedTokenBucket(10, Cache(str(tmp_path)), "requests")
+
+    for _ in range(10):
+        with first.transact():
+            assert first.wait_time(1) == 0
+            first.consume(1)
+
+    assert second.wait_time(1) > 0
+    second.drain()
+    assert first.wait_time(1) > 5  # Empty again: ~6 s per request at 10/min
+
+
+class EchoModel:
+    model_name = "echo"
+
+    def generate_content(self, prompt):
+        return prompt
+
+
+def test_worker_survives_quota_store_errors(monkeypatch):
+    import scheduler as scheduler_module
+    from scheduler import RequestScheduler, TokenBucket
+
+    monkeypatch.setattr(scheduler_module, "WORKER_ERROR_BACKOFF", 0.01)
+    failures = iter([RuntimeError("database is locked")])
+
+    class FlakyBucket(TokenBucket):
+        def transact(self):
+            error = next(failures, None)
+            if error:
+                raise error
+            return super().transact()
+
+    llm = RequestScheduler(workers=1, shared=False)
+    llm.requests = FlakyBucket(1000)
+    assert llm.generate(EchoModel(), "hello", timeout=5) == "hello"
+    assert llm.generate(EchoModel(), "again", timeout=5) == "again"
+
+
+def test_snapshot_counts_bumped_job_once():
+    from scheduler import RequestScheduler, PRIORITY_BATCH, PRIORITY_INTERACTIVE, _Job
+
+    llm = RequestScheduler(workers=0, shared=False)
+    job = _Job("key", EchoModel(), "prompt", PRIORITY_BATCH)
+    with llm._cond:
+        llm._inflight[job.key] = job
+        llm._push(job)
+        job.priority = PRIORITY_INTERACTIVE  # What generate() does when a more urgent caller joins
+        llm._push(job)
+    assert llm.snapshot()["queued"] == 1
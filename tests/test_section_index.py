@@ -0,0 +1,48 @@
+import pytest
+from chat_pdf import SUGGESTED_QUESTIONS
+from section_index import is_broad_question
+
+
+@pytest.mark.parametrize("question", SUGGESTED_QUESTIONS + [
+    "Summarize",
+    "tl;dr",
+    "Give me a brief overview of the whole document.",
+    "What is this paper about?",
+])
+def test_whole_document_questions_are_broad(question):
+    assert is_broad_question(question)
+
+
+@pytest.mark.parametrize("question", [
+    "What was the conclusion of the 2019 audit in section 4?",
+    "What does the summary table on page 12 say?",
+    "What are the main findings of the safety review?",
+    "Tell me about the budget.",
+    "Who signed the contract?",
+])
+def test_specific_questions_are_not_broad(question):
+    assert not is_broad_question(question)
+
+
+def test_failed_build_is_not_retried_until_backoff_expires(monkeypatch):
+    import section_index
+
+    class QuotaExhausted:
+        model_name = "fake"
+        calls = 0
+
+        def generate_content(self, prompt):
+            QuotaExhausted.calls += 1
+            raise RuntimeError("400 invalid request")
+
+    monkeypatch.setattr(section_index, "extractive_summary", lambda chunk, max_sentences: chunk)
+    model = QuotaExhausted()
+    chunks = ["A chunk of text."] * 3
+    tree = section_index.build_summary_tree("f" * 32, chunks, model)
+    assert tree["document"]  # Fallback text, not persisted
+    assert section_index.load_summary_tree("f" * 32) is None
+    calls = QuotaExhausted.calls
+
+    section_index.ensure_summary_tree("f" * 32, chunks, model)
+    assert "f" * 32 not in section_index._building  # No rebuild queued
+    assert QuotaExhausted.calls == calls
@@ -0,0 +1,59 @@
+import io
+import hashlib
+from uploads import spool_upload, get_spooled
+
+
+def test_spool_upload_hashes_each_in_memory_file():
+    # Freed BytesIO objects are often reallocated at the same address
+    for i in range(50):
+        data = f"%PDF-1.4 document {i}\n".encode() * (i + 1)
+        upload = spool_upload(io.BytesIO(data))
+        assert upload.file_hash == hashlib.md5(data).hexdigest()
+        assert upload.size == len(data)
+        with open(upload.path, "rb") as f:
+            assert f.read() == data
+
+
+def test_spool_upload_reuses_streamlit_file_id():
+    class Upload(io.BytesIO):
+        file_id = "upload-1"
+        name = "a.pdf"
+
+    first = spool_upload(Upload(b"%PDF-1.4 first"))
+    again = spool_upload(Upload(b"%PDF-1.4 first"))
+    assert again is first
+    assert get_spooled(first.file_hash).path == first.path
+
+
+def test_prune_keeps_opened_and_indexed_documents():
+    import os
+    import time
+    from cache import VECTORSTORE_DIR, CACHE_TTL
+    from uploads import _prune_spool
+
+    stale = time.time() - CACHE_TTL - 3600
+    opened, indexed, unused = (spool_upload(io.BytesIO(f"%PDF-1.4 prune {i}".encode())) for i in range(3))
+    for upload in (opened, indexed, unused):
+        os.utime(upload.path, (stale, stale))
+    os.makedirs(os.path.join(VECTORSTORE_DIR, indexed.file_hash), exist_ok=True)
+
+    assert get_spooled(opened.file_hash) is not None  # Opening refreshes it
+    _prune_spool()
+
+    assert get_spooled(opened.file_hash) is not None
+    assert get_spooled(indexed.file_hash) is not None
+    assert get_spooled(unused.file_hash) is None
+
+
+def test_failed_read_leaves_no_partial_file():
+    import os
+    import pytest
+    from uploads import SPOOL_DIR
+
+    class Broken(io.BytesIO):
+        def read(self, size=-1):
+            raise IOError("connection reset")
+
+    with pytest.raises(IOError):
+        spool_upload(Broken(b"%PDF-1.4 broken"))
+    assert not [name for name in os.listdir(SPOOL_DIR) if name.endswith(".part")]
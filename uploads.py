@@ -0,0 +1,130 @@
+import os
+import mmap
+import time
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from cache import CACHE_DIR, CACHE_TTL, VECTORSTORE_DIR
+
+SPOOL_DIR = os.path.join(CACHE_DIR, "uploads")
+SPOOL_BLOCK_SIZE = 1024 * 1024  # Bytes read/hashed/written per step
+MAX_TRACKED_UPLOADS = 256
+
+_spooled = OrderedDict()  # Streamlit file_id -> SpooledUpload
+_spooled_lock = threading.Lock()
+
+
+class SpooledUpload:
+    """
+    An uploaded PDF written once to disk under its content hash.
+
+    Extractors read it through a read-only memory map, so page data is
+    paged in by the OS on demand instead of being copied into the heap.
+    """
+
+    def __init__(self, path, file_hash, size, name=None):
+        self.path = path
+        self.file_hash = file_hash
+        self.size = size
+        self.name = name or os.path.basename(path)
+
+    @contextmanager
+    def open(self):
+        """Yield a seekable, read-only memory map of the file."""
+        with open(self.path, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                yield mapped
+            finally:
+                mapped.close()
+
+
+def _prune_spool(max_age=CACHE_TTL):
+    """
+    Delete spooled files not uploaded or opened for `max_age` seconds.
+
+    Documents with a persisted index (API uploads, library shards) are kept:
+    their spooled PDF is the stored copy that chat and summaries read from.
+    """
+    cutoff = time.time() - max_age
+    for entry in os.scandir(SPOOL_DIR):
+        try:
+            if not entry.is_file() or entry.stat().st_mtime >= cutoff:
+                continue
+            file_hash = entry.name.split(".")[0]
+            if entry.name.endswith(".pdf") and os.path.isdir(os.path.join(VECTORSTORE_DIR, file_hash)):
+                continue
+            os.remove(entry.path)
+        except OSError:
+            pass
+
+
+def spool_upload(uploaded_file):
+    """
+    Stream an upload to disk once, hashing it on the way.
+
+    Repeated calls for the same Streamlit upload (reruns) return the
+    already spooled file without re-reading it. Other file objects have no
+    stable identity, so they are always streamed and hashed.
+
+    Returns:
+        SpooledUpload
+    """
+    key = getattr(uploaded_file, "file_id", None)
+    if key:
+        with _spooled_lock:
+            upload = _spooled.get(key)
+            if upload is not None and os.path.exists(upload.path):
+                _spooled.move_to_end(key)
+                return upload
+
+    os.makedirs(SPOOL_DIR, exist_ok=True)
+    hasher = hashlib.md5()
+    size = 0
+    uploaded_file.seek(0)
+    fd, tmp_path = tempfile.mkstemp(dir=SPOOL_DIR, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                block = uploaded_file.read(SPOOL_BLOCK_SIZE)
+                if not block:
+                    break
+                hasher.update(block)
+                out.write(block)
+                size += len(block)
+    except BaseException:
+        os.remove(tmp_path)  # Don't leave a partial file behind
+        raise
+    finally:
+        uploaded_file.seek(0)
+
+    file_hash = hasher.hexdigest()
+    path = os.path.join(SPOOL_DIR, f"{file_hash}.pdf")
+    if os.path.exists(path):
+        os.remove(tmp_path)  # Same content already spooled by another session
+        os.utime(path)
+    else:
+        os.replace(tmp_path, path)
+        _prune_spool()
+
+    upload = SpooledUpload(path, file_hash, size, getattr(uploaded_file, "name", None))
+    if key:
+        with _spooled_lock:
+            _spooled[key] = upload
+            while len(_spooled) > MAX_TRACKED_UPLOADS:
+                _spooled.popitem(last=False)
+    return upload
+
+
+def get_spooled(file_hash):
+    """A previously spooled document by hash (from any process sharing SPOOL_DIR), or None."""
+    if not file_hash.isalnum():
+        return None
+    path = os.path.join(SPOOL_DIR, f"{file_hash}.pdf")
+    try:
+        os.utime(path)  # Still in use - keep it out of the next prune
+    except OSError:
+        return None
+    return SpooledUpload(path, file_hash, os.path.getsize(path))
@@ -113,11 +113,18 @@
 #     # Fix common OCR issues
 #     text = text.replace('ﬁ', 'fi').replace('ﬂ', 'fl')
 #     return text.strip()
+import os
 import hashlib
+import threading
 from PyPDF2 import PdfReader
 import pdfplumber
 import streamlit as st
 from datetime import datetime
+from cache import shared_cache
+from uploads import SpooledUpload, SPOOL_BLOCK_SIZE
+
+MAX_CONCURRENT_EXTRACTIONS = int(os.getenv("MAX_CONCURRENT_EXTRACTIONS", "4"))
+extraction_slots = threading.BoundedSemaphore(MAX_CONCURRENT_EXTRACTIONS)
 
 def read_pdf(file, method='pypdf2'):
     """
@@ -153,12 +160,69 @@ def read_pdf(file, method='pypdf2'):
         return ""
 
 
+def iter_page_texts(file, method='pypdf2'):
+    """
+    Yield page text one page at a time.
+    
+    Pages are parsed lazily, and pdfplumber page caches are released as
+    soon as a page is done, so memory stays flat for long documents.
+    """
+    if method == 'pdfplumber':
+        with pdfplumber.open(file) as pdf:
+            for page in pdf.pages:
+                yield page.extract_text() or ""
+                page.close()
+    else:
+        pdf = PdfReader(file)
+        for page in pdf.pages:
+            yield page.extract_text() or ""
+
+
+def extract_pages(file, method='pypdf2'):
+    """
+    Extract text page by page.
+    
+    Spooled uploads are read through a memory map; at most
+    MAX_CONCURRENT_EXTRACTIONS documents are parsed at once per process.
+    
+    Returns:
+        List of page text strings (empty string for pages without text)
+    """
+    with extraction_slots:
+        if isinstance(file, SpooledUpload):
+            with file.open() as stream:
+                return list(iter_page_texts(stream, method))
+        return list(iter_page_texts(file, method))
+
+
+def read_pdf_cached(file, file_hash, method='pypdf2'):
+    """
+    Read PDF text through the shared cache, keyed by file hash.
+    
+    Pages are extracted once per process (and kept on disk), no matter how
+    many sessions open the same document.
+    """
+    try:
+        pages = shared_cache.get_or_compute(
+            ("pages", file_hash, method),
+            lambda: extract_pages(file, method)
+        )
+        return "\n".join(page for page in pages if page).strip()
+    except Exception as e:
+        st.error(f"Error reading PDF: {str(e)}")
+        return ""
+
+
 def get_file_hash(file):
-    """Generate hash for file to use in caching."""
+    """Generate hash for file to use in caching (streamed in blocks)."""
+    if isinstance(file, SpooledUpload):
+        return file.file_hash
+    hasher = hashlib.md5()
     file.seek(0)
-    file_hash = hashlib.md5(file.read()).hexdigest()
+    for block in iter(lambda: file.read(SPOOL_BLOCK_SIZE), b""):
+        hasher.update(block)
     file.seek(0)
-    return file_hash
+    return hasher.hexdigest()
 
 
 def count_tokens(text):